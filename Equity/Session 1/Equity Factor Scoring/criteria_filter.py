@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+class CriteriaCache:
+    '''
+    Columnar cache of the criteria fields of a base universe, thresholds are applied locally by binary search
+    '''
+    def __init__(self, df_criteria):
+        self.index = df_criteria.index
+        self.sorted_values = {}
+        self.order = {}
+        for label in df_criteria.columns:
+            values = pd.to_numeric(df_criteria[label], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            # NaN sort last and never pass a criterion
+            order = np.argsort(values, kind='stable')
+            num_valid = int((~np.isnan(values)).sum())
+            self.order[label] = order[:num_valid]
+            self.sorted_values[label] = values[order[:num_valid]]
+
+    def get_mask(self, label, operator, value):
+        '''
+        Returns a boolean mask of the securities passing one criterion
+        '''
+        sorted_values, order = self.sorted_values[label], self.order[label]
+        if operator == '>':
+            rows = order[np.searchsorted(sorted_values, value, side='right'):]
+        elif operator == '<':
+            rows = order[:np.searchsorted(sorted_values, value, side='left')]
+        elif operator == '=':
+            rows = order[np.searchsorted(sorted_values, value, side='left'):np.searchsorted(sorted_values, value, side='right')]
+        else:
+            raise ValueError('Unknown operator {}'.format(operator))
+        mask = np.zeros(len(self.index), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def filter(self, criteria):
+        '''
+        Returns a boolean mask of the securities passing all criteria, a list of (label, operator, value)
+        '''
+        mask = np.ones(len(self.index), dtype=bool)
+        for label, operator, value in criteria:
+            mask &= self.get_mask(label, operator, value)
+        return mask
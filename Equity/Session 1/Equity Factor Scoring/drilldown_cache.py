@@ -0,0 +1,176 @@
+from collections import OrderedDict
+import bql
+import pandas as pd
+
+INDUSTRY_RETURN = '6M Cumul. Return (Industry Avg)'
+
+def get_drilldown_fields(bq):
+    '''
+    Returns the bql items of the drilldown of a security, the industry average is requested separately
+    '''
+    returns = bq.data.day_to_day_total_return(dates=bq.func.range('-6M', '0D')).znav()
+    eps = bq.data.is_eps(fpt='A', fpo=bq.func.range('-8','2'))
+    return {
+        'EPS': eps.with_additional_parameters(ae='A'),
+        'EPS Est.': eps.with_additional_parameters(ae='E'),
+        'Earning Surprise': (eps.with_additional_parameters(ae='A',fs='LR')-eps.with_additional_parameters(ae='E'))/ \
+        bq.func.abs(eps.with_additional_parameters(ae='E')),
+        '6M Cumul. Return': (1+returns).cumprod()-1,
+        'Target Price': bq.data.best_target_price(dates=bq.func.range('-1Y', '0D'), fill='prev'),
+        'Buy Rec': bq.data.tot_buy_rec(dates=bq.func.range('-1Y', '0D'), fill='prev'),
+        'Hold Rec': bq.data.tot_hold_rec(dates=bq.func.range('-1Y', '0D'), fill='prev'),
+        'Sell Rec': bq.data.tot_sell_rec(dates=bq.func.range('-1Y', '0D'), fill='prev'),
+    }
+
+def get_industry_field(bq, peers):
+    '''
+    Returns the bql item of the average cumulative return of a list of peers
+    '''
+    returns = bq.data.day_to_day_total_return(dates=bq.func.range('-6M', '0D')).znav()
+    return {INDUSTRY_RETURN: bq.func.value((1+returns.group(returns['date']).avg()).group().cumprod()-1,bq.univ.list(peers))}
+
+def split_drilldown(response, tickers):
+    '''
+    Returns a dictionary of the return, recommendation and earnings dataframes of each ticker of a drilldown response
+    '''
+    def by_ticker(name, date_col):
+        df = response.get(name).df()
+        return {ticker: df.loc[df.index == ticker].set_index(date_col)[[name]] for ticker in tickers}
+
+    series = {name: by_ticker(name, 'DATE') for name in ['6M Cumul. Return', 'Target Price', 'Buy Rec', 'Hold Rec', 'Sell Rec']}
+    series.update({name: by_ticker(name, 'PERIOD_END_DATE') for name in ['EPS', 'EPS Est.']})
+    return {
+        ticker: {
+            'return': series['6M Cumul. Return'][ticker],
+            'rec': pd.concat([series[name][ticker] for name in ['Target Price', 'Buy Rec', 'Hold Rec', 'Sell Rec']], axis=1),
+            'eps': pd.concat([series[name][ticker] for name in ['EPS', 'EPS Est.']], axis=1),
+        }
+        for ticker in tickers
+    }
+
+class DrilldownCache:
+    '''
+    LRU cache of the drilldown data of securities, keyed by ticker and as-of date, and of the industry
+    average returns, keyed by industry, as-of date and peers so that peers of an industry share one request
+    '''
+    def __init__(self, bq, max_size=200):
+        self.bq = bq
+        self.max_size = max_size
+        self.securities = OrderedDict()
+        self.industries = OrderedDict()
+        # key -> (future, function caching the response), keys of a batch share the same future
+        self.pending = {}
+
+    @staticmethod
+    def as_of_date():
+        '''
+        Returns the as-of date of the drilldown requests, relative dates resolve to today
+        '''
+        return pd.Timestamp.today().strftime('%Y-%m-%d')
+
+    @staticmethod
+    def industry_key(industry, peers, as_of_date):
+        return (industry, as_of_date, tuple(sorted(peers)))
+
+    def lookup(self, store, key):
+        '''
+        Returns a cached value and marks it as most recently used, None when missing
+        '''
+        if key not in store:
+            return None
+        store.move_to_end(key)
+        return store[key]
+
+    def store(self, store, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_size:
+            store.popitem(last=False)
+
+    def request_securities(self, tickers, as_of_date):
+        '''
+        Requests the drilldown data of a list of tickers in a single request, cached once collected
+        '''
+        def on_response(response):
+            for ticker, value in split_drilldown(response, tickers).items():
+                self.store(self.securities, (ticker, as_of_date), value)
+
+        # like request_planner.execute_plan, a callback turns the execute into a future
+        future = self.bq.execute(bql.Request(list(tickers), get_drilldown_fields(self.bq)), lambda resp: resp)
+        for ticker in tickers:
+            self.pending[(ticker, as_of_date)] = (future, on_response)
+
+    def request_industry(self, industry, peers, as_of_date):
+        '''
+        Requests the average return of the peers of an industry, cached once collected
+        '''
+        key = self.industry_key(industry, peers, as_of_date)
+        def on_response(response):
+            df = response.get(INDUSTRY_RETURN).df()
+            self.store(self.industries, key, df.loc[df.index == peers[0]].set_index('DATE')[[INDUSTRY_RETURN]])
+
+        future = self.bq.execute(bql.Request(peers[0], get_industry_field(self.bq, peers)), lambda resp: resp)
+        self.pending[key] = (future, on_response)
+
+    def collect(self, key):
+        '''
+        Waits for the pending request of a key and caches its response, failures are retried by the caller
+        '''
+        if key not in self.pending:
+            return
+        future, on_response = self.pending[key]
+        try:
+            on_response(future.result())
+        except Exception:
+            pass
+        finally:
+            for other in [other for other, (f, _) in self.pending.items() if f is future]:
+                del self.pending[other]
+
+    def cancel(self):
+        '''
+        Cancels the pending requests, responses of requests already running are discarded
+        '''
+        for future, _ in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def get(self, ticker, industry, peers):
+        '''
+        Returns the earnings, return (security and industry average) and recommendation dataframes of a
+        security, from the cache or a prefetched request when available, otherwise requested now
+        '''
+        as_of_date = self.as_of_date()
+        key = (ticker, as_of_date)
+        industry_key = self.industry_key(industry, peers, as_of_date)
+        self.collect(key)
+        self.collect(industry_key)
+
+        value = self.lookup(self.securities, key)
+        if value is None:
+            self.request_securities([ticker], as_of_date)
+            self.collect(key)
+            value = self.lookup(self.securities, key)
+        df_industry = self.lookup(self.industries, industry_key)
+        if df_industry is None:
+            self.request_industry(industry, peers, as_of_date)
+            self.collect(industry_key)
+            df_industry = self.lookup(self.industries, industry_key)
+
+        return value['eps'], pd.concat([value['return'], df_industry], axis=1), value['rec']
+
+    def prefetch(self, tickers, industries, peers):
+        '''
+        Requests asynchronously the drilldown data of a list of tickers not yet cached, in one request,
+        and the industry average of each of their industries (peers: dictionary of the peers of each industry)
+        '''
+        as_of_date = self.as_of_date()
+        missing = [ticker for ticker in tickers
+                   if (ticker, as_of_date) not in self.securities and (ticker, as_of_date) not in self.pending]
+        if missing:
+            self.request_securities(missing, as_of_date)
+
+        for industry in set(industries):
+            key = self.industry_key(industry, peers[industry], as_of_date)
+            if key not in self.industries and key not in self.pending:
+                self.request_industry(industry, peers[industry], as_of_date)
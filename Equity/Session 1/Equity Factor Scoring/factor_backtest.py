@@ -0,0 +1,170 @@
+import hashlib
+import os
+import bql
+import numpy as np
+import pandas as pd
+import factors
+from fields_mapping import get_grouping_fields
+from scoring_engine import group_quantile, group_ranks, score_factors
+
+FORWARD_RETURN = 'Forward Return'
+_FREQUENCIES = {'Monthly': 'M', 'Quarterly': 'Q'}
+_PERIODS_PER_YEAR = {'Monthly': 12, 'Quarterly': 4}
+
+def get_rebalance_dates(start, end, frequency='Monthly'):
+    '''
+    Returns the rebalancing calendar, the last business day of each month or quarter between start and end
+    '''
+    days = pd.bdate_range(start, end)
+    return pd.DatetimeIndex(days.to_series().groupby(days.to_period(_FREQUENCIES[frequency])).max().values)
+
+def get_snapshot_items(bq, start, end, factor_names=None):
+    '''
+    Returns the bql items of a snapshot: factor inputs as of start, grouping fields and the total return from start to end
+    '''
+    items = dict(**factors.get_factor_inputs(bq, factor_names, start), **get_grouping_fields(bq))
+    items[FORWARD_RETURN] = bq.data.total_return(CALC_INTERVAL=bq.func.range(START=start, END=end), CURRENCY='USD')
+    return items
+
+def get_cache_path(cache_dir, universe_key, start, end, items):
+    '''
+    Returns the cache file of a snapshot, any change of universe, dates or bql items gives a new file
+    '''
+    key = repr((universe_key, start, end, sorted((name, str(item)) for name, item in items.items())))
+    return os.path.join(cache_dir, '{}.pkl'.format(hashlib.md5(key.encode('utf-8')).hexdigest()))
+
+def load_snapshots(bq, get_universe, universe_key, dates, factor_names=None, cache_dir='backtest_cache', batch_size=12):
+    '''
+    Returns a dataframe of the factor inputs, grouping fields and forward return of every rebalancing date,
+    indexed by (Date, ID)
+
+    get_universe: function returning the bql universe as of a date (e.g. index members at that date)
+    universe_key: hashable description of the universe, part of the cache key
+    Snapshots are read from cache_dir when available, the others are requested batch_size at a time with
+    execute_many and cached once their forward period is over.
+    '''
+    os.makedirs(cache_dir, exist_ok=True)
+    today = pd.Timestamp.today().normalize()
+    periods = [(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')) for start, end in zip(dates[:-1], dates[1:])]
+
+    snapshots, pending = {}, []
+    for start, end in periods:
+        items = get_snapshot_items(bq, start, end, factor_names)
+        path = get_cache_path(cache_dir, universe_key, start, end, items)
+        if os.path.exists(path):
+            snapshots[start] = pd.read_pickle(path)
+        else:
+            pending.append((start, end, items, path))
+
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        # field names are generic in the requests, as in request_planner
+        keys = [{'F{}'.format(k): name for k, name in enumerate(items)} for _, _, items, _ in batch]
+        request_package = [
+            bql.Request(get_universe(start), {key: items[name] for key, name in batch_keys.items()}, with_params={'mode':'cached'})
+            for (start, _, items, _), batch_keys in zip(batch, keys)
+        ]
+        # execute_many returns the responses in the order of the requests
+        response = bq.execute_many(request_package)
+        for (start, end, _, path), batch_keys, r in zip(batch, keys, response):
+            df = pd.concat([r.get(key).df()[key] for key in batch_keys], axis=1).rename(columns=batch_keys)
+            df.index.name = 'ID'
+            if pd.Timestamp(end) < today:
+                df.to_pickle(path)
+            snapshots[start] = df
+
+    return pd.concat([snapshots[start] for start, _ in periods], keys=[pd.Timestamp(start) for start, _ in periods], names=['Date', 'ID'])
+
+def get_backtest_scores(df_snapshots, function_name='Z-score', sector=None, factor_names=None):
+    '''
+    Returns the factor scores of every snapshot, names are only scored against names of the same date (and sector)
+    '''
+    factor_names = list(factors.FACTOR_REGISTRY) if factor_names is None else factor_names
+    df_factors = factors.compute_factors(df_snapshots, factor_names)
+    groups = pd.Series(df_snapshots.index.get_level_values('Date').strftime('%Y-%m-%d'), index=df_snapshots.index)
+    if sector is not None:
+        groups = groups + '|' + df_snapshots[sector].astype(str)
+    return score_factors(df_factors, function_name, groups)
+
+def rank_ic(scores, returns, date_codes, num_dates):
+    '''
+    Returns the Spearman rank correlation between scores and forward returns of each date
+    '''
+    valid = ~np.isnan(scores) & ~np.isnan(returns)
+    x = group_ranks(np.where(valid, scores, np.nan), date_codes, num_dates)[2].astype(np.float64)
+    y = group_ranks(np.where(valid, returns, np.nan), date_codes, num_dates)[2].astype(np.float64)
+    codes = date_codes[valid]
+    x, y = x[valid], y[valid]
+    n = np.bincount(codes, minlength=num_dates)
+    sx, sy = np.bincount(codes, weights=x, minlength=num_dates), np.bincount(codes, weights=y, minlength=num_dates)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = np.bincount(codes, weights=x * y, minlength=num_dates) - sx * sy / n
+        var_x = np.bincount(codes, weights=x * x, minlength=num_dates) - sx * sx / n
+        var_y = np.bincount(codes, weights=y * y, minlength=num_dates) - sy * sy / n
+        ic = cov / np.sqrt(var_x * var_y)
+    ic[~np.isfinite(ic)] = np.nan
+    return ic
+
+def run_backtest(df_snapshots, df_scores, score='Composite Score', num_quantiles=5, frequency='Monthly'):
+    '''
+    Returns a dictionary of the equal weighted quantile portfolio returns (Q1 lowest scores to Qn highest
+    scores, and the Qn - Q1 long/short), their cumulative returns, the rank IC and the one-way turnover of
+    each quantile per rebalancing date, and summary tables of the portfolios and the IC
+    '''
+    date_codes, dates = pd.factorize(df_snapshots.index.get_level_values('Date'), sort=True)
+    name_codes, names = pd.factorize(df_snapshots.index.get_level_values('ID'))
+    num_dates, num_names = len(dates), len(names)
+    values = pd.to_numeric(df_scores[score], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    returns = pd.to_numeric(df_snapshots[FORWARD_RETURN], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    quantile = group_quantile(values, date_codes, num_dates, num_quantiles)
+    has_quantile = ~np.isnan(quantile)
+    cells = date_codes[has_quantile] * num_quantiles + quantile[has_quantile].astype(np.int64) - 1
+    has_return = ~np.isnan(returns[has_quantile])
+    counts = np.bincount(cells, minlength=num_dates * num_quantiles).reshape(num_dates, num_quantiles)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        port_returns = (np.bincount(cells[has_return], weights=returns[has_quantile][has_return], minlength=num_dates * num_quantiles) /
+                        np.bincount(cells[has_return], minlength=num_dates * num_quantiles)).reshape(num_dates, num_quantiles)
+
+    columns = ['Q{}'.format(q + 1) for q in range(num_quantiles)]
+    df_returns = pd.DataFrame(port_returns, index=dates, columns=columns)
+    df_returns['Long/Short'] = df_returns[columns[-1]] - df_returns[columns[0]]
+
+    # turnover: half the absolute change of the equal weights between consecutive dates
+    labels = np.zeros((num_dates, num_names), dtype=np.int64)
+    labels[date_codes[has_quantile], name_codes[has_quantile]] = quantile[has_quantile].astype(np.int64)
+    turnover = np.full((num_dates, num_quantiles), np.nan)
+    with np.errstate(divide='ignore'):
+        inv_counts = np.where(counts > 0, 1. / counts, 0.)
+    for q in range(num_quantiles):
+        weights = np.where(labels == q + 1, inv_counts[:, q][:, None], 0.)
+        turnover[1:, q] = 0.5 * np.abs(np.diff(weights, axis=0)).sum(axis=1)
+    df_turnover = pd.DataFrame(turnover, index=dates, columns=columns)
+
+    ic = pd.Series(rank_ic(values, returns, date_codes, num_dates), index=dates, name='Rank IC')
+
+    periods_per_year = _PERIODS_PER_YEAR[frequency]
+    num_periods = df_returns.notna().sum()
+    summary = pd.DataFrame({
+        'Ann. Return': (1 + df_returns.fillna(0)).prod() ** (periods_per_year / num_periods.clip(lower=1)) - 1,
+        'Ann. Volatility': df_returns.std() * np.sqrt(periods_per_year),
+        'Sharpe': df_returns.mean() / df_returns.std() * np.sqrt(periods_per_year),
+        'Hit Rate': (df_returns > 0).sum() / num_periods.clip(lower=1),
+        'Avg Turnover': df_turnover.mean().reindex(df_returns.columns),
+        'Avg Names': pd.Series(counts.mean(axis=0), index=columns).reindex(df_returns.columns),
+    })
+    ic_summary = pd.Series({
+        'Mean': ic.mean(),
+        'Std': ic.std(),
+        'Ann. IR': ic.mean() / ic.std() * np.sqrt(periods_per_year),
+        'Hit Rate': (ic > 0).sum() / max(ic.notna().sum(), 1),
+    }, name='Rank IC')
+
+    return {
+        'returns': df_returns,
+        'cumulative': (1 + df_returns.fillna(0)).cumprod() - 1,
+        'ic': ic,
+        'turnover': df_turnover,
+        'summary': summary,
+        'ic_summary': ic_summary,
+    }
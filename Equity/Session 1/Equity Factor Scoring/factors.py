@@ -1,31 +1,82 @@
-# define factors
-# Size
-def size_mcap(bq):
-    field = bq.data.cur_mkt_cap(CURRENCY = 'USD', FILL = 'PREV')/1000000
-    return field
+import numpy as np
+import pandas as pd
 
-# Value
-def value_B2M(bq):
-    field_01 = 1 / bq.data.px_to_book_ratio(FA_PERIOD_TYPE = 'LTM', FILL = 'PREV')
-    field_02 = 1 / bq.data.px_to_book_ratio(FA_PERIOD_TYPE = 'A', FILL = 'PREV')
-    field = bq.func.avail(field_01, field_02)
-    return field
+def point_in_time(as_of_date):
+    '''
+    Returns the dates parameter of a point-in-time input, no parameter for the latest value
+    '''
+    return {} if as_of_date is None else {'DATES': as_of_date}
 
-# momentum
-def mom_12M_minus_1M(bq):
-    field = bq.data.total_return(CALC_INTERVAL = bq.func.range(START='-12M', END = '-1M'), CURRENCY = 'USD')
-    return field
+def shift_date(as_of_date, offset):
+    '''
+    Returns the as-of date shifted by a relative offset ('-12M', '-2Y', ...), the offset itself for the latest value
+    '''
+    if as_of_date is None:
+        return offset
+    num, unit = int(offset[:-1]), offset[-1].upper()
+    shift = {'D': pd.DateOffset(days=num), 'W': pd.DateOffset(weeks=num), 'M': pd.DateOffset(months=num), 'Y': pd.DateOffset(years=num)}[unit]
+    return (pd.Timestamp(as_of_date) + shift).strftime('%Y-%m-%d')
 
-# Volatility factor
-def vol_2y_stdev(bq):
-    field = bq.data.volatility(CALC_INTERVAL='2Y', CURRENCY = 'USD', PER = 'W')
-    return field
 
-# quality
-def quality_OP2BE(bq):
-    field_01 = (bq.data.is_oper_inc(FA_PERIOD_TYPE = 'LTM', FILL = 'PREV') /
-                bq.data.TOT_COMMON_EQY (FA_PERIOD_TYPE = 'LTM', FILL = 'PREV'))
-    field_02 = (bq.data.is_oper_inc(FA_PERIOD_TYPE = 'A', FILL = 'PREV') /
-                bq.data.TOT_COMMON_EQY (FA_PERIOD_TYPE = 'A', FILL = 'PREV'))
-    field = bq.func.avail(field_01, field_02)
-    return field
\ No newline at end of file
+# factor registry: raw bql inputs of each factor and the local combination of their values
+# inputs are shared by name across factors, so a field used by several factors is requested once
+# inputs take an as-of date for point-in-time values, None for the latest value
+FACTOR_REGISTRY = {
+    'Size': {
+        'inputs': {
+            'Mkt Cap (USD)': lambda bq, as_of_date=None: bq.data.cur_mkt_cap(CURRENCY = 'USD', FILL = 'PREV', **point_in_time(as_of_date)),
+        },
+        'combine': lambda df: df['Mkt Cap (USD)'] / 1000000
+    },
+    'Value': {
+        'inputs': {
+            'P/B LTM': lambda bq, as_of_date=None: bq.data.px_to_book_ratio(FA_PERIOD_TYPE = 'LTM', FILL = 'PREV', **point_in_time(as_of_date)),
+            'P/B A': lambda bq, as_of_date=None: bq.data.px_to_book_ratio(FA_PERIOD_TYPE = 'A', FILL = 'PREV', **point_in_time(as_of_date)),
+        },
+        # avail: LTM when available, annual otherwise
+        'combine': lambda df: (1 / df['P/B LTM']).fillna(1 / df['P/B A'])
+    },
+    'Momentum': {
+        'inputs': {
+            'Total Return 12M-1M (USD)': lambda bq, as_of_date=None: bq.data.total_return(
+                CALC_INTERVAL = bq.func.range(START=shift_date(as_of_date, '-12M'), END = shift_date(as_of_date, '-1M')), CURRENCY = 'USD'),
+        },
+        'combine': lambda df: df['Total Return 12M-1M (USD)']
+    },
+    'Volatility': {
+        'inputs': {
+            'Volatility 2Y Weekly (USD)': lambda bq, as_of_date=None: bq.data.volatility(
+                CALC_INTERVAL='2Y' if as_of_date is None else bq.func.range(START=shift_date(as_of_date, '-2Y'), END=as_of_date), CURRENCY = 'USD', PER = 'W'),
+        },
+        'combine': lambda df: df['Volatility 2Y Weekly (USD)']
+    },
+    'Quality': {
+        'inputs': {
+            'Oper Inc LTM': lambda bq, as_of_date=None: bq.data.is_oper_inc(FA_PERIOD_TYPE = 'LTM', FILL = 'PREV', **point_in_time(as_of_date)),
+            'Common Equity LTM': lambda bq, as_of_date=None: bq.data.TOT_COMMON_EQY(FA_PERIOD_TYPE = 'LTM', FILL = 'PREV', **point_in_time(as_of_date)),
+            'Oper Inc A': lambda bq, as_of_date=None: bq.data.is_oper_inc(FA_PERIOD_TYPE = 'A', FILL = 'PREV', **point_in_time(as_of_date)),
+            'Common Equity A': lambda bq, as_of_date=None: bq.data.TOT_COMMON_EQY(FA_PERIOD_TYPE = 'A', FILL = 'PREV', **point_in_time(as_of_date)),
+        },
+        'combine': lambda df: (df['Oper Inc LTM'] / df['Common Equity LTM']).fillna(df['Oper Inc A'] / df['Common Equity A'])
+    },
+}
+
+def get_factor_inputs(bq, factor_names=None, as_of_date=None):
+    '''
+    Returns a dictionary of the raw bql inputs of the factors, by input name, as of a date (None for the latest value)
+    '''
+    factor_names = list(FACTOR_REGISTRY) if factor_names is None else factor_names
+    return {
+        input_name: get_input(bq, as_of_date)
+        for name in factor_names
+        for input_name, get_input in FACTOR_REGISTRY[name]['inputs'].items()
+    }
+
+def compute_factors(df_inputs, factor_names=None):
+    '''
+    Returns a dataframe of factor values computed locally from the dataframe of raw inputs
+    '''
+    factor_names = list(FACTOR_REGISTRY) if factor_names is None else factor_names
+    df = pd.DataFrame({name: FACTOR_REGISTRY[name]['combine'](df_inputs) for name in factor_names}, index=df_inputs.index)
+    # divisions by zero are missing values, as in bql
+    return df.replace([np.inf, -np.inf], np.nan)
@@ -0,0 +1,49 @@
+import bql
+import pandas as pd
+
+def plan_requests(items, max_fields=20, max_chars=2000):
+    '''
+    Returns the request plan of a dictionary of named bql items
+
+    Items with the same bql expression are requested once, and the distinct expressions are split
+    into batches of at most max_fields items and max_chars characters of expressions.
+    The plan holds the distinct items by expression, the expression of each name and the batches.
+    '''
+    expressions, names = {}, {}
+    for name, item in items.items():
+        expression = str(item)
+        expressions.setdefault(expression, item)
+        names[name] = expression
+
+    batches, batch, size = [], [], 0
+    for expression in expressions:
+        if batch and (len(batch) >= max_fields or size + len(expression) > max_chars):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(expression)
+        size += len(expression)
+    if batch:
+        batches.append(batch)
+
+    return {'expressions': expressions, 'names': names, 'batches': batches}
+
+def execute_plan(bq, universe, plan, with_params=None):
+    '''
+    Returns a dataframe with one column per name of the plan, the batches are executed concurrently
+    '''
+    keys = {expression: 'F{}'.format(i) for i, expression in enumerate(plan['expressions'])}
+    kwargs = {} if with_params is None else {'with_params': with_params}
+
+    # like BQL_Util.batch_exec_reqs, a callback turns each execute into a future
+    result_promises = [
+        bq.execute(bql.Request(universe, {keys[expression]: plan['expressions'][expression] for expression in batch}, **kwargs),
+                   lambda resp: resp)
+        for batch in plan['batches']
+    ]
+    columns = {}
+    for promise in result_promises:
+        for res in promise.result():
+            columns[res.name] = res.df()[res.name]
+
+    df = pd.concat(columns, axis=1)
+    return pd.DataFrame({name: df[keys[expression]] for name, expression in plan['names'].items()}, index=df.index)
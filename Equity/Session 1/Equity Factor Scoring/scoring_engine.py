@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+
+def get_group_codes(groups, size):
+    '''
+    Returns integer group codes and the number of groups, names without a group form their own group
+    '''
+    if groups is None:
+        return np.zeros(size, dtype=np.int64), 1
+    codes, uniques = pd.factorize(pd.Series(groups))
+    codes = np.where(codes < 0, len(uniques), codes)
+    return codes.astype(np.int64), len(uniques) + 1
+
+def group_zscore(values, codes, num_groups):
+    '''
+    Returns the z-score of each value within its group (sample standard deviation)
+    '''
+    valid = ~np.isnan(values)
+    count = np.bincount(codes, weights=valid, minlength=num_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.bincount(codes, weights=np.where(valid, values, 0.), minlength=num_groups) / count
+        dev = np.where(valid, values - mean[codes], 0.)
+        std = np.sqrt(np.bincount(codes, weights=dev * dev, minlength=num_groups) / (count - 1))
+        zscore = (values - mean[codes]) / std[codes]
+    zscore[~np.isfinite(zscore)] = np.nan
+    return zscore
+
+def group_ranks(values, codes, num_groups):
+    '''
+    Returns the sorting order by group then value, the start of each group in that order, the rank
+    of each value within its group (ties get the lowest rank) and the number of valid values per group
+    '''
+    valid = ~np.isnan(values)
+    # NaN sort last within their group
+    order = np.lexsort((values, codes))
+    sorted_codes, sorted_values = codes[order], values[order]
+    group_start = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=num_groups))[:-1]])
+
+    position = np.arange(len(values))
+    new_run = np.ones(len(values), dtype=bool)
+    new_run[1:] = (sorted_codes[1:] != sorted_codes[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+    run_start = np.maximum.accumulate(np.where(new_run, position, 0))
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = run_start - group_start[sorted_codes]
+    count = np.bincount(codes, weights=valid, minlength=num_groups).astype(np.int64)
+    return order, group_start, ranks, count
+
+def group_quantile(values, codes, num_groups, num_quantiles):
+    '''
+    Returns the quantile bucket (1 to num_quantiles) of each value within its group
+    '''
+    _, _, ranks, count = group_ranks(values, codes, num_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        quantile = np.floor(ranks * float(num_quantiles) / count[codes]) + 1
+    quantile[np.isnan(values)] = np.nan
+    return quantile
+
+def group_percentile(values, codes, num_groups):
+    '''
+    Returns the percentile bucket (1 to 100) of each value within its group
+    '''
+    return group_quantile(values, codes, num_groups, 100)
+
+def group_winsorize(values, codes, num_groups, limits=(0.01, 0.99)):
+    '''
+    Returns the values clipped to the lower and upper quantiles of their group
+    '''
+    order, group_start, _, count = group_ranks(values, codes, num_groups)
+    sorted_values = values[order]
+    has_values = count > 0
+    lower_idx = group_start + np.floor(limits[0] * np.maximum(count - 1, 0)).astype(np.int64)
+    upper_idx = group_start + np.ceil(limits[1] * np.maximum(count - 1, 0)).astype(np.int64)
+    lower = np.where(has_values, sorted_values[np.minimum(lower_idx, len(values) - 1)], np.nan)
+    upper = np.where(has_values, sorted_values[np.minimum(upper_idx, len(values) - 1)], np.nan)
+    return np.clip(values, lower[codes], upper[codes])
+
+def score_factors(df_factors, function_name='Z-score', groups=None, winsorize_limits=None):
+    '''
+    Returns a dataframe with a score per factor column ('<factor> Score') and their average ('Composite Score')
+
+    df_factors: dataframe of raw factor values, one row per security
+    function_name: 'Z-score' or 'Percentile'
+    groups: series of group per security for group-neutral scores, None to score the whole universe
+    winsorize_limits: (lower, upper) quantiles to clip the factor values to before scoring, None for no clipping
+    '''
+    codes, num_groups = get_group_codes(None if groups is None else groups.reindex(df_factors.index), len(df_factors))
+    scores = {}
+    for col in df_factors.columns:
+        values = pd.to_numeric(df_factors[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        if winsorize_limits is not None:
+            values = group_winsorize(values, codes, num_groups, winsorize_limits)
+        if function_name == 'Percentile':
+            scores['{} Score'.format(col)] = group_percentile(values, codes, num_groups)
+        else:
+            # by default do Zscore
+            scores['{} Score'.format(col)] = group_zscore(values, codes, num_groups)
+
+    df_scores = pd.DataFrame(scores, index=df_factors.index)
+    with np.errstate(invalid='ignore'):
+        values = df_scores.to_numpy()
+        count = (~np.isnan(values)).sum(axis=1)
+        df_scores['Composite Score'] = np.where(count > 0, np.nansum(values, axis=1) / np.maximum(count, 1), np.nan)
+    return df_scores
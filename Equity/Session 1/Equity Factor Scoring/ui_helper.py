@@ -13,7 +13,8 @@ class CriteriaWidgets(HBox):
     def __init__(self, label_name, operator, value, max_value=100, min_value=0):
         self.label = Label(label_name, layout=_label_layout)
         self.operator = Dropdown(options=['<','>','='], layout=_sign_layout, value=operator)
-        self.value = FloatSlider(value=value, max=max_value, min=min_value, layout=_criteria_layout)
+        # filters are applied locally, once the slider is released
+        self.value = FloatSlider(value=value, max=max_value, min=min_value, layout=_criteria_layout, continuous_update=False)
         
         super().__init__(children=[self.label, self.operator, self.value])
         
@@ -181,4 +182,28 @@ def get_scatter(data, group, score_x, score_y):
 
     )
     fig_scatter.update_layout(template='plotly_dark', width=1000, height=500)
-    return go.FigureWidget(fig_scatter)
\ No newline at end of file
+    return go.FigureWidget(fig_scatter)
+
+def generate_backtest_graph(results, score):
+    df_cumul = results['cumulative']
+    summary = results['summary']
+    quantiles = [col for col in df_cumul.columns if col != 'Long/Short']
+    palette = px.colors.diverging.RdYlGn
+    color_list = [palette[int(round(q * (len(palette) - 1) / max(len(quantiles) - 1, 1)))] for q in range(len(quantiles))]
+
+    fig = make_subplots(rows=2, cols=2, subplot_titles=['Cumulative Return', 'Annualised Return', 'Rank IC', 'Turnover'])
+    for idx, col in enumerate(quantiles):
+        fig.add_trace(go.Scatter(name=col, x=df_cumul.index, y=df_cumul[col], marker_color=color_list[idx]), row=1, col=1)
+    fig.add_trace(go.Scatter(name='Long/Short', x=df_cumul.index, y=df_cumul['Long/Short'], line={'color': 'white', 'dash': 'dash'}), row=1, col=1)
+    fig.add_trace(go.Bar(name='Ann. Return', x=summary.index, y=summary['Ann. Return'], marker_color=color_list + ['white'], showlegend=False), row=1, col=2)
+    fig.add_trace(go.Bar(name='Rank IC', x=results['ic'].index, y=results['ic'], marker_color='RoyalBlue', showlegend=False), row=2, col=1)
+    fig.add_trace(go.Scatter(name='Rank IC (12 periods avg)', x=results['ic'].index, y=results['ic'].rolling(12, min_periods=1).mean(), marker_color='white', showlegend=False), row=2, col=1)
+    for idx in [0, len(quantiles) - 1]:
+        col = quantiles[idx]
+        fig.add_trace(go.Scatter(name='{} Turnover'.format(col), x=results['turnover'].index, y=results['turnover'][col], marker_color=color_list[idx], showlegend=False), row=2, col=2)
+
+    fig.update_yaxes(tickformat='.0%', row=1, col=1)
+    fig.update_yaxes(tickformat='.0%', row=1, col=2)
+    fig.update_yaxes(tickformat='.0%', row=2, col=2)
+    fig.update_layout(template='plotly_dark',title='{} Quantile Backtest (Rank IC mean {:.3f})'.format(score, results['ic_summary']['Mean']),legend_orientation='h', width=1000, height=700, autosize=False)
+    return go.FigureWidget(fig)
\ No newline at end of file
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+METRIC_COLUMNS = ['PnL Pcts', 'Win Pcts', 'Num Trades', 'Max Win', 'Max Loss', 'Sharpe', 'Sortino',
+                  'Max Drawdown', 'Turnover', 'Avg Holding']
+
+def backtest_metrics(res, init_cap, periods_per_year=252):
+    '''
+    Function to compute the backtesting metrics of all pairs at once from the backtest kernel buffers
+
+    Trade statistics come from the flat trade arrays (np.bincount/ ufunc.at by pair), return
+    statistics from the daily marked-to-market capital. Ratios are annualised, pairs without
+    trades get 0 for trade based metrics.
+
+    Parameters:
+    -----------
+    res: dictionary returned by backtest_kernel/ spread_kernel
+    init_cap: floating value of initial capital
+    periods_per_year: number of trading days per year
+
+    Returns
+    -------
+    dictionary of arrays, one value per pair:
+        PnL Pcts       total return, floored at -100%
+        Win Pcts       share of trades with a positive pnl
+        Num Trades     number of closed trades
+        Max Win        largest winning trade pnl
+        Max Loss       largest losing trade pnl
+        Sharpe         annualised mean/ standard deviation of daily returns
+        Sortino        annualised mean/ downside deviation of daily returns
+        Max Drawdown   largest peak to trough fall of the marked-to-market capital
+        Turnover       traded notional (entry and exit) per year over average capital
+        Avg Holding    average number of days a trade is held
+    '''
+
+    equity = res['daily_equity']
+    num_days, num_pairs = equity.shape
+    pair, pnl = res['pair'], res['pnl']
+
+    num_trades = np.bincount(pair, minlength=num_pairs)
+    num_wins = np.bincount(pair, weights=pnl > 0, minlength=num_pairs)
+    max_win, max_loss = np.zeros(num_pairs), np.zeros(num_pairs)
+    np.maximum.at(max_win, pair[pnl > 0], pnl[pnl > 0])
+    np.minimum.at(max_loss, pair[pnl <= 0], pnl[pnl <= 0])
+    holding = np.bincount(pair, weights=res['exit_idx'] - res['entry_idx'], minlength=num_pairs)
+    # position size is the capital before the trade, traded once to open and once to close
+    notional = np.bincount(pair, weights=2 * np.abs(res['capital'] - pnl), minlength=num_pairs)
+    final_cap = res['daily_cap'][-1] if num_days else np.full(num_pairs, init_cap, dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_pcts = np.where(num_trades > 0, num_wins / num_trades, 0.0)
+        avg_holding = np.where(num_trades > 0, holding / num_trades, 0.0)
+
+        prev_equity = np.vstack([np.full((1, num_pairs), init_cap, dtype=np.float64), equity[:-1]])
+        returns = np.where(prev_equity > 0, equity / prev_equity - 1, 0.0)
+        mean_ret = returns.mean(axis=0)
+        std_ret = returns.std(axis=0, ddof=1) if num_days > 1 else np.zeros(num_pairs)
+        downside = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=0))
+        sharpe = np.where(std_ret > 0, mean_ret / std_ret * np.sqrt(periods_per_year), 0.0)
+        sortino = np.where(downside > 0, mean_ret / downside * np.sqrt(periods_per_year), 0.0)
+
+        peak = np.maximum.accumulate(np.vstack([np.full((1, num_pairs), init_cap, dtype=np.float64), equity]), axis=0)
+        max_drawdown = np.where(peak[1:] > 0, equity / peak[1:] - 1, -1.0).min(axis=0, initial=0.0)
+
+        avg_equity = equity.mean(axis=0) if num_days else np.full(num_pairs, init_cap, dtype=np.float64)
+        years = max(num_days, 1) / periods_per_year
+        turnover = np.where(avg_equity > 0, notional / avg_equity / years, 0.0)
+
+    return {
+        'PnL Pcts': np.maximum(-1, (final_cap - init_cap)/ init_cap),
+        'Win Pcts': win_pcts,
+        'Num Trades': num_trades,
+        'Max Win': max_win,
+        'Max Loss': max_loss,
+        'Sharpe': sharpe,
+        'Sortino': sortino,
+        'Max Drawdown': np.maximum(max_drawdown, -1),
+        'Turnover': turnover,
+        'Avg Holding': avg_holding
+    }
+
+def metrics_frame(metrics, key_pairs):
+    '''
+    Function to arrange the metrics of backtest_metrics in a dataframe
+
+    Parameters:
+    -----------
+    metrics: dictionary of metric arrays
+    key_pairs: list of pairs, in the order of the kernel columns
+
+    Returns
+    -------
+    dataframe of metrics, one row per pair
+    '''
+
+    return pd.DataFrame({col: metrics[col] for col in METRIC_COLUMNS}, index=pd.Index(key_pairs, tupleize_cols=False))
@@ -1,47 +1,289 @@
+import numpy as np
 import pandas as pd
-import math, statistics
+import math
+from collections.abc import Mapping
+from BacktestMetrics import METRIC_COLUMNS, backtest_metrics, metrics_frame
+
+
+def rolling_zscores(residuals, lookbacks):
+    '''
+    Function to compute rolling z-scores of many residual series in one pass 
+    
+    Pairs sharing a lookback window are processed together; rolling sums of each block come 
+    from cumulative sums over the residual matrix. Matches pandas rolling(window).mean()/.std() 
+    (sample standard deviation, NaN until the window is full). 
+    
+    Parameters:
+    -----------
+    residuals: array of residual series, one row per pair (num pairs x num days)
+    lookbacks: integer rolling window of each pair 
+    
+    Returns
+    -------
+    array of z-scores (num pairs x num days)
+    '''
+    
+    num_pairs, num_days = residuals.shape
+    zscores = np.full((num_pairs, num_days), np.nan)
+    lookbacks = np.asarray(lookbacks, dtype=np.int64)
+    
+    for window in np.unique(lookbacks):
+        if window < 2 or window > num_days:
+            continue
+        idx = np.flatnonzero(lookbacks == window)
+        # centering keeps the cumulative sums small and well conditioned 
+        block = residuals[idx] - residuals[idx].mean(axis=1, keepdims=True)
+        csum = np.zeros((idx.size, num_days + 1))
+        csum_sq = np.zeros((idx.size, num_days + 1))
+        np.cumsum(block, axis=1, out=csum[:, 1:])
+        np.cumsum(block * block, axis=1, out=csum_sq[:, 1:])
+        win_sum = csum[:, window:] - csum[:, :-window]
+        win_sum_sq = csum_sq[:, window:] - csum_sq[:, :-window]
+        win_avg = win_sum/ window
+        win_std = np.sqrt(np.maximum(win_sum_sq - win_sum * win_avg, 0)/ (window - 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            zscores[idx, window - 1:] = (block[:, window - 1:] - win_avg)/ win_std
+    return zscores
+
+
+class LazyZScores(Mapping):
+    '''
+    Read-only dict-of-Series view over a z-score matrix, a Series is only built when a pair is accessed 
+    '''
+    
+    def __init__(self, key_pairs, zscore_matrix):
+        self._index = {key_pair: i for i, key_pair in enumerate(key_pairs)}
+        self._matrix = zscore_matrix
+    
+    def __getitem__(self, key_pair):
+        return pd.Series(self._matrix[self._index[key_pair]])
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self):
+        return len(self._index)
+
+
+def leg_spreads(price, leg_idx, weights):
+    '''
+    Function to compute the traded spreads of pairs or baskets as weighted sums of their legs 
+    
+    Parameters:
+    -----------
+    price: array of traded prices (num days x num tickers)
+    leg_idx: column index of each leg, one row per pair/ basket (num spreads x max num legs)
+    weights: weight of each leg, zero for the padding of shorter baskets (num spreads x max num legs)
+    
+    Returns
+    -------
+    array of spreads (num days x num spreads)
+    '''
+    
+    spreads = price[:, leg_idx[:, 0]] * weights[:, 0]
+    for j in range(1, leg_idx.shape[1]):
+        spreads = spreads + price[:, leg_idx[:, j]] * weights[:, j]
+    return spreads
+
+
+def backtest_kernel(price, indep_idx, dep_idx, hedge_ratios, zscores, std, init_cap, exit_band=0.5, costs=None):
+    '''
+    Function to backtest all pairs at once as an array-backed state machine 
+    
+    Parameters:
+    -----------
+    price: array of traded prices (num days x num tickers)
+    indep_idx: column index of the independent ticker of each pair 
+    dep_idx: column index of the dependent ticker of each pair 
+    hedge_ratios: array of hedge ratios, one per pair 
+    zscores: array of residual z-scores (num days x num pairs)
+    std: absolute value of standard deviation for trading signals generation 
+    init_cap: floating value of initial capital 
+    exit_band: absolute z-score under which positions are closed 
+    costs: costs bound to the legs (dependent, independent) of the pairs (CostModel.bind), None for frictionless fills 
+    
+    Returns
+    -------
+    dictionary of spreads, trades (sorted by pair then exit date, with offsets per pair), 
+    daily capital and number of days traded per pair 
+    '''
+    
+    spreads = price[:, dep_idx] - (price[:, indep_idx] * hedge_ratios)
+    return spread_kernel(spreads, zscores, std, init_cap, exit_band, costs=costs)
+
+
+def spread_kernel(spreads, zscores, std, init_cap, exit_band=0.5, close_last=True, costs=None):
+    '''
+    Function to backtest many spreads (pairs or baskets) at once as an array-backed state machine 
+    
+    Steps through the dates once and updates the position of every spread with vectorised 
+    operations, applying the same rules and arithmetic as the per-pair loop: entry when 
+    |z-score| > std, exit when |z-score| < exit_band or the z-score changes sign, close on 
+    the last day and stop trading once capital is no longer positive. With a cost model, the 
+    execution costs of both legs at entry and exit and the borrow accrued while the position 
+    is open are deducted from the pnl of the trade. 
+    
+    Parameters:
+    -----------
+    spreads: array of traded spreads (num days x num spreads)
+    zscores: array of residual z-scores (num days x num spreads)
+    std: absolute value of standard deviation for trading signals generation, scalar or one per spread 
+    init_cap: floating value of initial capital, scalar or one per spread 
+    exit_band: absolute z-score under which positions are closed, scalar or one per spread 
+    close_last: close the open positions on the last day, False to keep them open (see SignalEngine)
+    costs: costs bound to the legs of the spreads (CostModel.bind), None for frictionless fills 
+    
+    Returns
+    -------
+    dictionary of spreads, trades (sorted by spread then exit date, with offsets per spread), 
+    daily capital (realised and marked to market), costs per trade, number of days traded per 
+    spread and the final position state 
+    '''
+    
+    num_days, num_pairs = spreads.shape
+    
+    pos = np.zeros(num_pairs, dtype=np.int8)
+    start_spread, start_num_spread = np.zeros(num_pairs), np.zeros(num_pairs)
+    start_idx = np.zeros(num_pairs, dtype=np.int64)
+    cap = np.full(num_pairs, init_cap, dtype=np.float64)
+    active = np.ones(num_pairs, dtype=bool)
+    stop_idx = np.full(num_pairs, num_days, dtype=np.int64)
+    daily_cap = np.empty((num_days, num_pairs))
+    daily_equity = np.empty((num_days, num_pairs))
+    cost_paid = np.zeros(num_pairs)
+    trades = []
+    
+    for i in range(num_days):
+        # Stop trading if capital becomes negative
+        stopped = active & (cap <= 0)
+        stop_idx[stopped] = i
+        active &= ~stopped
+        
+        zscore, spread = zscores[i], spreads[i]
+        flat = active & (pos == 0)
+        open_long = flat & (zscore < -std)
+        open_short = flat & ~open_long & (zscore > std)
+        if close_last and i == num_days - 1:
+            # Last Trading Day - close the position 
+            close = active & (pos != 0)
+        else:
+            # Take profit immediately once mean reverted 
+            close = active & (pos != 0) & ((np.abs(zscore) < exit_band) | ((pos == 1) & (zscore > 0)) | ((pos == -1) & (zscore < 0)))
+        
+        idx = np.flatnonzero(close)
+        if idx.size:
+            end_spread = spread[idx]
+            pnl = np.where(pos[idx] == 1, (end_spread - start_spread[idx]) * start_num_spread[idx], 
+                           (start_spread[idx] - end_spread) * start_num_spread[idx])
+            if costs is not None:
+                trade_cost = cost_paid[idx] + costs.execution(i, idx, start_num_spread[idx])
+                pnl = pnl - trade_cost
+                cost_paid[idx] = 0
+            else:
+                trade_cost = np.zeros(idx.size)
+            cap[idx] = cap[idx] + pnl
+            trades.append((idx, start_idx[idx], np.full(idx.size, i), pnl, cap[idx], trade_cost))
+            pos[idx] = 0
+        
+        idx = np.flatnonzero(open_long | open_short)
+        if idx.size:
+            start_spread[idx] = spread[idx]
+            pos[idx] = np.where(open_long[idx], 1, -1)
+            start_num_spread[idx] = cap[idx]/ np.abs(spread[idx])
+            start_idx[idx] = i
+            if costs is not None:
+                cost_paid[idx] = costs.execution(i, idx, start_num_spread[idx])
+        
+        if costs is not None:
+            # borrow on the short legs of the positions held overnight 
+            idx = np.flatnonzero(active & (pos != 0))
+            if idx.size:
+                cost_paid[idx] += costs.holding(i, idx, pos[idx], start_num_spread[idx])
+        
+        daily_cap[i] = cap
+        # capital marked to market with the open positions, frozen once trading stopped 
+        daily_equity[i] = cap + np.where(active & (pos == 1), (spread - start_spread) * start_num_spread, 
+                                         np.where(active & (pos == -1), (start_spread - spread) * start_num_spread, 0.0))
+        if costs is not None:
+            daily_equity[i] -= np.where(active, cost_paid, 0.0)
+    
+    if trades:
+        pair, entry_idx, exit_idx, pnl, capital, cost = (np.concatenate(col) for col in zip(*trades))
+        order = np.argsort(pair, kind='stable')
+        pair, entry_idx, exit_idx, pnl, capital, cost = pair[order], entry_idx[order], exit_idx[order], pnl[order], capital[order], cost[order]
+    else:
+        pair, entry_idx, exit_idx = (np.zeros(0, dtype=np.int64) for _ in range(3))
+        pnl, capital, cost = np.zeros(0), np.zeros(0), np.zeros(0)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(pair, minlength=num_pairs))])
+    
+    return {
+        'spreads': spreads,
+        'pair': pair,
+        'entry_idx': entry_idx,
+        'exit_idx': exit_idx,
+        'pnl': pnl,
+        'capital': capital,
+        'cost': cost,
+        'offsets': offsets,
+        'daily_cap': daily_cap,
+        'daily_equity': daily_equity,
+        'stop_idx': stop_idx,
+        'state': {'pos': pos, 'start_spread': start_spread, 'start_num_spread': start_num_spread, 
+                  'start_idx': start_idx, 'cap': cap, 'active': active, 'cost_paid': cost_paid}
+    }
 
 class BacktestingModel(object):
     '''
     BacktestingModel class for computation of backtesting metrics 
     '''
+    
+    def __init__(self):
+        self.exit_band = 0.5
+        self.cost_model = None
         
-    def initialise_model(self, coint_pairs, data, init_cap, std):
+    def initialise_model(self, coint_pairs, data, init_cap, std, exit_band=0.5, cost_model=None):
         '''
         Function to initialise a BacktestingModel object 
         
         Parameters:
         -----------
-        coint_pairs: dictionary of cointegrated pairs
+        coint_pairs: dictionary of cointegrated pairs (or baskets)
         data: dictionary of bql fields 
         init_cap: floating value of initial capital 
         std: absolute value of standard deviation for trading signals generation 
+        exit_band: absolute z-score under which positions are closed 
+        cost_model: CostModel of transaction costs, borrow and slippage, None for frictionless fills 
         '''
         
         self.coint_pairs = coint_pairs
         self.data = data
         self.init_cap = init_cap 
         self.std = std
+        self.exit_band = exit_band
+        self.cost_model = cost_model
         self.zscores = self.get_zscores()  
         
     def get_zscores(self):
         '''
         Function to get residual z-scores for co-integrated pairs  
         
+        The z-scores are stored in self.zscore_matrix (one row per pair, in the order of 
+        self.key_pairs), the returned mapping builds a Series per pair on access. 
+        
         Returns
         -------
         dictionary of z-score series 
         '''
         
-        zscores = {}
-        for key_pair, coint_res in self.coint_pairs.items():
-            lookback = math.ceil(coint_res[1])
-            spread_window = coint_res[2].rolling(window=lookback)
-            spread_avg = spread_window.mean()
-            spread_std = spread_window.std()
-            zscore = (coint_res[2] - spread_avg)/ spread_std 
-            zscores[key_pair] = zscore
-        return zscores 
+        self.key_pairs = list(self.coint_pairs.keys())
+        num_days = len(self.data.get('dates'))
+        if self.key_pairs:
+            residuals = np.vstack([np.asarray(coint_res[2], dtype=np.float64) for coint_res in self.coint_pairs.values()])
+        else:
+            residuals = np.zeros((0, num_days))
+        lookbacks = [math.ceil(coint_res[1]) for coint_res in self.coint_pairs.values()]
+        self.zscore_matrix = rolling_zscores(residuals, lookbacks)
+        return LazyZScores(self.key_pairs, self.zscore_matrix)
     
     def get_spread(self, indep_price, dep_price, hedge_ratio):
         '''
@@ -82,9 +324,42 @@ class BacktestingModel(object):
         else:
             return (start_spread - end_spread) * start_num_spread
     
+    def get_legs(self, columns):
+        '''
+        Function to get the legs of the cointegrated pairs/ baskets as column indices and weights 
+        
+        A pair (independent, dependent) with hedge ratio h trades dependent - h * independent, 
+        a basket from CointModel.screen_baskets trades the weighted sum of its tickers. 
+        
+        Parameters:
+        -----------
+        columns: tickers of the price columns 
+        
+        Returns
+        -------
+        array of leg column indices, array of leg weights (num pairs x max num legs)
+        '''
+        
+        col_idx = {ticker: i for i, ticker in enumerate(columns)}
+        num_legs = max([len(key_pair) for key_pair in self.key_pairs], default=2)
+        leg_idx = np.zeros((len(self.key_pairs), num_legs), dtype=np.int64)
+        weights = np.zeros((len(self.key_pairs), num_legs), dtype=np.float64)
+        
+        for p, (key_pair, coint_res) in enumerate(zip(self.key_pairs, self.coint_pairs.values())):
+            if np.ndim(coint_res[0]) == 0:
+                legs, leg_weights = (key_pair[1], key_pair[0]), (1.0, -coint_res[0])
+            else:
+                legs, leg_weights = key_pair, coint_res[0]
+            # shorter baskets are padded with their first leg at zero weight 
+            leg_idx[p] = col_idx[legs[0]]
+            leg_idx[p, :len(legs)] = [col_idx[ticker] for ticker in legs]
+            weights[p, :len(legs)] = leg_weights
+        return leg_idx, weights
+    
     def run(self):
         '''
-        Function to carry out backtesting for all cointegrated pairs 
+        Function to carry out backtesting for all cointegrated pairs, or baskets when given 
+        the output of CointModel.screen_baskets 
         
         Returns
         -------
@@ -93,57 +368,20 @@ class BacktestingModel(object):
 
         trade_dates, pnl_vals, cap_vals, all_spreads = {}, {}, {}, {}
         dates = self.data.get('dates') 
+        price = self.data.get('price')
         
-        for key_pair, coint_res in self.coint_pairs.items():
-            indep_ticker_id, dep_ticker_id = key_pair[0], key_pair[1]
-            indep_price = self.data.get('price')[indep_ticker_id].tolist()
-            dep_price = self.data.get('price')[dep_ticker_id].tolist()
-            hedge_ratio = coint_res[0]
-            zscore = self.zscores.get(key_pair).tolist()
-            trade_date, pnl_val, cap_val, all_spread = [], [], [self.init_cap, ], []
-            start_spread, start_price, start_pos, start_num_spread, start_cap, start_date = None, None, 0, None, self.init_cap, None 
-            
-            for i in range(len(zscore)):
-                # Stop trading if capital becomes negative
-                if start_cap <= 0:
-                    break
-                # Last Trading Day - close the position 
-                if i == (len(zscore)-1) and start_pos != 0:
-                    end_spread = self.get_spread(indep_price[i], dep_price[i], hedge_ratio)
-                    pnl = self.get_pnl(start_pos, start_spread, end_spread, start_num_spread)
-                    start_cap = start_cap + pnl
-                    trade_date.append((start_date, dates[i]))
-                    pnl_val.append(pnl)
-                    cap_val.append(start_cap) 
-                    start_pos = 0
-                # Open a position - buy or long the spread 
-                elif start_pos == 0 and zscore[i] < -self.std:
-                    start_spread = self.get_spread(indep_price[i], dep_price[i], hedge_ratio)
-                    start_pos = 1 
-                    start_num_spread = start_cap/abs(start_spread)
-                    start_date = dates[i]
-                # Open a position - sell the spread 
-                elif start_pos == 0 and zscore[i] > self.std:
-                    start_spread = self.get_spread(indep_price[i], dep_price[i], hedge_ratio)
-                    start_pos = -1 
-                    start_num_spread = start_cap/abs(start_spread)
-                    start_date = dates[i]
-                # Take profit immediately once mean reverted 
-                elif (start_pos != 0 and abs(zscore[i]) < 0.5) or (start_pos == 1 and zscore[i] > 0) or (start_pos == -1 and zscore[i] < 0):
-                    end_spread = self.get_spread(indep_price[i], dep_price[i], hedge_ratio)
-                    pnl = self.get_pnl(start_pos, start_spread, end_spread, start_num_spread)
-                    start_cap = start_cap + pnl
-                    trade_date.append((start_date, dates[i]))
-                    pnl_val.append(pnl)
-                    cap_val.append(start_cap)
-                    start_pos = 0
-                    
-                all_spread.append(self.get_spread(indep_price[i], dep_price[i], hedge_ratio))
-                    
-            trade_dates[key_pair] = trade_date
-            pnl_vals[key_pair] = pnl_val
-            cap_vals[key_pair] = cap_val
-            all_spreads[key_pair] = all_spread
+        leg_idx, weights = self.get_legs(price.columns)
+        spreads = leg_spreads(price.values.astype(np.float64), leg_idx, weights)
+        costs = self.cost_model.bind(price, leg_idx, weights) if self.cost_model is not None else None
+        self.kernel_results = spread_kernel(spreads, self.zscore_matrix.T, self.std, self.init_cap, self.exit_band, costs=costs)
+        res = self.kernel_results
+        
+        for p, key_pair in enumerate(self.key_pairs):
+            start, end = res['offsets'][p], res['offsets'][p + 1]
+            trade_dates[key_pair] = [(dates[i], dates[j]) for i, j in zip(res['entry_idx'][start:end], res['exit_idx'][start:end])]
+            pnl_vals[key_pair] = res['pnl'][start:end].tolist()
+            cap_vals[key_pair] = [self.init_cap, ] + res['capital'][start:end].tolist()
+            all_spreads[key_pair] = res['spreads'][:res['stop_idx'][p], p].tolist()
             
         self.trade_dates = trade_dates 
         self.pnl_vals = pnl_vals
@@ -157,49 +395,103 @@ class BacktestingModel(object):
             'all_spreads': self.all_spreads
         }
     
+    def run_walk_forward(self, windows, data, init_cap, std):
+        '''
+        Function to carry out out-of-sample backtesting of walk-forward windows 
+        
+        The pairs of each window are traded on its trading window only, with the hedge ratio, 
+        intercept and z-score lookback estimated on the formation window. Z-scores are rolled 
+        causally over the formation and trading residuals, each window starts from init_cap 
+        and positions still open are closed on the last day of the trading window. The exit band 
+        and cost model are the ones of initialise_model (0.5 and frictionless fills by default). 
+        
+        Parameters:
+        -----------
+        windows: list of walk-forward windows from CointModel.walk_forward 
+        data: dictionary of bql fields 
+        init_cap: floating value of initial capital 
+        std: absolute value of standard deviation for trading signals generation 
+        
+        Returns
+        -------
+        dictionary of trades and per window summary dataframes 
+        '''
+        
+        dates = data.get('dates')
+        tickers = data.get('univ_tickers')
+        col_idx = {ticker: i for i, ticker in enumerate(tickers)}
+        price_frame = data.get('price')[tickers]
+        price = price_frame.values.astype(np.float64)
+        log_price = data.get('log_price')[tickers].values.astype(np.float64)
+        trades, summary = [], []
+        
+        for window in windows:
+            form_start, form_end = window['formation']
+            trade_start, trade_end = window['trading']
+            key_pairs = list(window['coint_pairs'].keys())
+            indep_idx = np.array([col_idx[key_pair[0]] for key_pair in key_pairs], dtype=np.int64)
+            dep_idx = np.array([col_idx[key_pair[1]] for key_pair in key_pairs], dtype=np.int64)
+            hedge_ratios = np.array([window['coint_pairs'][key_pair][0] for key_pair in key_pairs], dtype=np.float64)
+            intercepts = np.array([window['intercepts'][key_pair] for key_pair in key_pairs], dtype=np.float64)
+            lookbacks = [math.ceil(window['coint_pairs'][key_pair][1]) for key_pair in key_pairs]
+            
+            residuals = (log_price[form_start:trade_end, dep_idx] - log_price[form_start:trade_end, indep_idx] * hedge_ratios - intercepts).T
+            zscores = rolling_zscores(residuals, lookbacks)[:, trade_start - form_start:]
+            costs = None
+            if self.cost_model is not None:
+                leg_idx = np.stack([dep_idx, indep_idx], axis=1)
+                weights = np.stack([np.ones(len(key_pairs)), -hedge_ratios], axis=1)
+                costs = self.cost_model.bind(price_frame.iloc[trade_start:trade_end], leg_idx, weights)
+            res = backtest_kernel(price[trade_start:trade_end], indep_idx, dep_idx, hedge_ratios, zscores.T, std, init_cap, 
+                                  self.exit_band, costs=costs)
+            
+            for k in range(len(res['pair'])):
+                key_pair = key_pairs[res['pair'][k]]
+                trades.append({
+                    'Formation Start': dates[form_start], 'Trading Start': dates[trade_start],
+                    'Independent': key_pair[0], 'Dependent': key_pair[1],
+                    'Entry Date': dates[trade_start + res['entry_idx'][k]], 'Exit Date': dates[trade_start + res['exit_idx'][k]],
+                    'PnL': res['pnl'][k], 'Capital': res['capital'][k]
+                })
+            final_cap = res['daily_cap'][-1] if len(key_pairs) else np.zeros(0)
+            summary.append({
+                'Formation Start': dates[form_start], 'Trading Start': dates[trade_start], 'Trading End': dates[trade_end - 1],
+                'Num Pairs': len(key_pairs), 'Num Trades': len(res['pair']),
+                'PnL Pcts': (final_cap.mean() - init_cap)/ init_cap if len(key_pairs) else 0.0
+            })
+        
+        self.wf_trades = pd.DataFrame(trades, columns=['Formation Start', 'Trading Start', 'Independent', 'Dependent', 
+                                                        'Entry Date', 'Exit Date', 'PnL', 'Capital'])
+        self.wf_summary = pd.DataFrame(summary, columns=['Formation Start', 'Trading Start', 'Trading End', 
+                                                          'Num Pairs', 'Num Trades', 'PnL Pcts'])
+        
+        return {
+            'trades': self.wf_trades,
+            'summary': self.wf_summary
+        }
+    
     def compute_bt_metrics(self):
         '''
-        Function to screen for quality cointegrated pairs 
+        Function to compute the backtesting metrics of the cointegrated pairs from the kernel buffers of run 
         
         Returns
         -------
-        dictionary of quality cointegrated pairs with corresponding curated backtesting metrics 
+        dictionary of cointegrated pairs with corresponding curated backtesting metrics 
         '''
         
-        pnl_pcts, win_pcts, tot_trades, max_wins, max_losses, sharpe_ratios = {}, {}, {}, {}, {}, {}
-        num_days = len(self.data.get('dates'))
+        metrics = backtest_metrics(self.kernel_results, self.init_cap)
+        self.metrics = metrics_frame(metrics, self.key_pairs)
         
-        for key_pair, coint_res in self.coint_pairs.items():
-            pnl = self.pnl_vals.get(key_pair)
-            tot_pnl = sum(pnl)
-            pnl_pct = (self.cap_vals.get(key_pair)[-1] - self.init_cap)/ self.init_cap
-            win_trade = sum(1 for i in pnl if i > 0)
-            lose_trade = sum(1 for i in pnl if i <= 0)
-            tot_trade = win_trade + lose_trade
-            win_pct = win_trade/ tot_trade
-                  
-            # if pnl_pct < 0.3 or tot_trade <= num_days//100 or win_pct < 0.3 or coint_res[0] <= 0:
-            #     continue
-            # else:
-            pnl_pct_lst = pd.Series(self.cap_vals.get(key_pair)).pct_change()[1:]
-            # sharpe_ratio = statistics.mean(pnl_pct_lst)/ statistics.stdev(pnl_pct_lst)
-            # if sharpe_ratio > 0.5:
-            max_win = max(list(i for i in pnl if i > 0), default=0)
-            max_loss = min(list(i for i in pnl if i <= 0), default=0)
-
-            pnl_pcts[key_pair] = max(-1,pnl_pct)
-            win_pcts[key_pair] = win_pct
-            tot_trades[key_pair] = tot_trade
-            max_wins[key_pair] = max_win
-            max_losses[key_pair] = max_loss
-            # sharpe_ratios[key_pair] = sharpe_ratio
-                             
-        self.pnl_pcts = pnl_pcts
-        self.win_pcts = win_pcts
-        self.tot_trades = tot_trades
-        self.max_wins = max_wins
-        self.max_losses = max_losses
-        # self.sharpe_ratios = sharpe_ratios
+        self.pnl_pcts = dict(zip(self.key_pairs, metrics['PnL Pcts'].tolist()))
+        self.win_pcts = dict(zip(self.key_pairs, metrics['Win Pcts'].tolist()))
+        self.tot_trades = dict(zip(self.key_pairs, metrics['Num Trades'].tolist()))
+        self.max_wins = dict(zip(self.key_pairs, metrics['Max Win'].tolist()))
+        self.max_losses = dict(zip(self.key_pairs, metrics['Max Loss'].tolist()))
+        self.sharpe_ratios = dict(zip(self.key_pairs, metrics['Sharpe'].tolist()))
+        self.sortino_ratios = dict(zip(self.key_pairs, metrics['Sortino'].tolist()))
+        self.max_drawdowns = dict(zip(self.key_pairs, metrics['Max Drawdown'].tolist()))
+        self.turnovers = dict(zip(self.key_pairs, metrics['Turnover'].tolist()))
+        self.holding_periods = dict(zip(self.key_pairs, metrics['Avg Holding'].tolist()))
                     
         return {
             'pnl_pcts': self.pnl_pcts,
@@ -207,6 +499,101 @@ class BacktestingModel(object):
             'tot_trades': self.tot_trades, 
             'max_wins': self.max_wins,
             'max_losses': self.max_losses,
-            # 'sharpe_ratios': self.sharpe_ratios
+            'sharpe_ratios': self.sharpe_ratios,
+            'sortino_ratios': self.sortino_ratios,
+            'max_drawdowns': self.max_drawdowns,
+            'turnovers': self.turnovers,
+            'holding_periods': self.holding_periods
+        }
+    
+    def sweep(self, stds=(1, 1.5, 2), exit_bands=(0.25, 0.5, 0.75), lookback_mults=(0.5, 1, 2), init_caps=None):
+        '''
+        Function to backtest all pairs over a grid of trading parameters in a single kernel pass 
+        
+        Every (lookback multiplier, entry std, exit band) combination of every pair is a column of 
+        one spread_kernel run; the z-scores of each lookback multiplier are rolled once from the 
+        screening residuals. Trade sizes are proportional to capital, so the initial capital only 
+        scales the capital and pnl: other capitals are derived from the first one instead of simulated, 
+        unless the cost model has volume-dependent slippage. 
+        
+        Parameters:
+        -----------
+        stds: entry thresholds (absolute z-score)
+        exit_bands: exit thresholds (absolute z-score)
+        lookback_mults: multipliers of the half-life used as z-score lookback 
+        init_caps: initial capitals, defaults to self.init_cap 
+        
+        Returns
+        -------
+        dictionary of the results cube (one row per parameter set and pair id, the position of the pair 
+        in key_pairs) and its summary per parameter set 
+        '''
+        
+        init_caps = [self.init_cap] if init_caps is None else list(init_caps)
+        stds, exit_bands, lookback_mults = (np.asarray(x, dtype=np.float64) for x in (stds, exit_bands, lookback_mults))
+        price = self.data.get('price')
+        num_pairs = len(self.key_pairs)
+        
+        leg_idx, weights = self.get_legs(price.columns)
+        spreads = leg_spreads(price.values.astype(np.float64), leg_idx, weights)
+        residuals = np.vstack([np.asarray(coint_res[2], dtype=np.float64) for coint_res in self.coint_pairs.values()]) if num_pairs else np.zeros((0, len(price)))
+        half_lives = np.array([coint_res[1] for coint_res in self.coint_pairs.values()], dtype=np.float64)
+        lookbacks = np.concatenate([np.ceil(mult * half_lives) for mult in lookback_mults]).astype(np.int64)
+        zscores = rolling_zscores(np.tile(residuals, (len(lookback_mults), 1)), lookbacks)
+        
+        # columns ordered by lookback multiplier, entry std, exit band, then pair 
+        mult_idx, std_idx, band_idx, pair_idx = (x.ravel() for x in np.meshgrid(
+            np.arange(len(lookback_mults)), np.arange(len(stds)), np.arange(len(exit_bands)), np.arange(num_pairs), indexing='ij'))
+        costs = self.cost_model.bind(price, leg_idx[pair_idx], weights[pair_idx]) if self.cost_model is not None else None
+        scale_invariant = costs is None or self.cost_model.scale_invariant()
+        
+        cube, metrics = [], None
+        for init_cap in init_caps:
+            if metrics is None or not scale_invariant:
+                base_cap = init_cap
+                res = spread_kernel(spreads[:, pair_idx], zscores[mult_idx * num_pairs + pair_idx].T, stds[std_idx], 
+                                    base_cap, exit_bands[band_idx], costs=costs)
+                metrics = backtest_metrics(res, base_cap)
+            frame = pd.DataFrame({
+                'Lookback Mult': lookback_mults[mult_idx], 'Entry Std': stds[std_idx], 'Exit Band': exit_bands[band_idx], 
+                'Init Cap': init_cap, 'Pair ID': pair_idx
+            })
+            # pnl amounts scale with the initial capital, ratios do not 
+            for col in METRIC_COLUMNS:
+                frame[col] = metrics[col] * init_cap / base_cap if col in ('Max Win', 'Max Loss') else metrics[col]
+            frame['Final Cap'] = init_cap * (1 + metrics['PnL Pcts'])
+            cube.append(frame)
+        self.sweep_results = pd.concat(cube, ignore_index=True) if cube else pd.DataFrame()
+        
+        grid = self.sweep_results.groupby(['Lookback Mult', 'Entry Std', 'Exit Band', 'Init Cap'])
+        self.sweep_summary = pd.DataFrame({
+            'Mean PnL Pcts': grid['PnL Pcts'].mean(),
+            'Median PnL Pcts': grid['PnL Pcts'].median(),
+            'Pct Profitable': grid['PnL Pcts'].apply(lambda x: (x > 0).mean()),
+            'Win Pcts': grid['Win Pcts'].mean(),
+            'Num Trades': grid['Num Trades'].sum(),
+            'Mean Sharpe': grid['Sharpe'].mean(),
+            'Mean Max Drawdown': grid['Max Drawdown'].mean()
+        }).reset_index()
+        
+        return {
+            'results': self.sweep_results,
+            'summary': self.sweep_summary
         }
-            
\ No newline at end of file
+    
+    def sweep_heatmap(self, value='Mean PnL Pcts', x='Entry Std', y='Exit Band'):
+        '''
+        Function to pivot the sweep summary into a 2D grid, averaging over the other parameters 
+        
+        Parameters:
+        -----------
+        value: column of the sweep summary 
+        x: parameter on the columns 
+        y: parameter on the rows 
+        
+        Returns
+        -------
+        dataframe of value by y (rows) and x (columns)
+        '''
+        
+        return self.sweep_summary.pivot_table(index=y, columns=x, values=value, aggfunc='mean')
@@ -1,15 +1,35 @@
 import numpy as np
 import pandas as pd
+import time
+import heapq
+from itertools import combinations, count
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
 from statsmodels.tsa.stattools import adfuller 
+from statsmodels.tsa.adfvalues import mackinnonp, mackinnoncrit
+from statsmodels.tsa.vector_ar.vecm import coint_johansen
+from scipy.cluster.hierarchy import linkage, fcluster
+from scipy.spatial.distance import squareform
 from sklearn.linear_model import LinearRegression
 
+class ScreeningCancelled(Exception):
+    '''
+    Exception raised when the screening is cancelled, the pairs found so far stay in coint_pairs 
+    '''
+
 class CointModel(object):
     '''
-    CointModel class for Engle-Granger 2-steps Cointegration Screening 
+    CointModel class for Engle-Granger 2-steps Cointegration Screening and Johansen basket screening 
     '''
     
     def __init__(self):
         self.residual_lag = 1
+        self.chunk_size = 2048
+        self.prefilter = None
+        self.prefilter_report = None
+        self.progress = None
+        self.cancel_event = None
     
     def initialise_model(self, data, sig_lvl):
         '''
@@ -23,6 +43,211 @@ class CointModel(object):
         
         self.data = data
         self.sig_lvl = sig_lvl
+        self.reset_unit_root_cache()
+    
+    def reset_unit_root_cache(self):
+        '''
+        Function to clear the per-universe cache of first difference ADF results 
+        '''
+        
+        self.unit_root_cache = {}
+        self.cache_hits, self.cache_misses = 0, 0
+    
+    def is_integrated(self, ticker_id):
+        '''
+        Function to check whether a ticker is I(1), i.e. its first difference series is stationary 
+        
+        Each ticker is tested once per universe, later calls are served from the cache 
+        
+        Parameters:
+        -----------
+        ticker_id: name of ticker 
+        
+        Returns
+        -------
+        ADF result of the first difference series 
+        '''
+        
+        if ticker_id in self.unit_root_cache:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            self.unit_root_cache[ticker_id] = self.adf_test(self.data.get('first_diff')[ticker_id])[0]
+        return self.unit_root_cache[ticker_id]
+    
+    def eligible_tickers(self):
+        '''
+        Function to pre-filter the universe to I(1) tickers before pair generation 
+        
+        Returns
+        -------
+        list of tickers eligible for cointegration testing 
+        '''
+        
+        return [ticker for ticker in self.data.get('univ_tickers') if self.is_integrated(ticker)]
+    
+    def cache_info(self):
+        '''
+        Function to report the usage of the unit-root cache 
+        
+        Returns
+        -------
+        dictionary of hits, misses and number of cached tickers 
+        '''
+        
+        return {'hits': self.cache_hits, 'misses': self.cache_misses, 'size': len(self.unit_root_cache)}
+    
+    def set_prefilter(self, top_k=10, min_corr=None, num_clusters=None, sectors=None):
+        '''
+        Function to configure the correlation pre-filter applied before the cointegration tests 
+        
+        A pair is kept if either ticker is among the top_k most correlated tickers of the other, 
+        and if given, its correlation is at least min_corr, both tickers fall in the same 
+        hierarchical cluster and share the same sector. 
+        
+        Parameters:
+        -----------
+        top_k: number of candidate pairs kept per ticker, None for no limit 
+        min_corr: minimum log price correlation, None for no threshold 
+        num_clusters: number of clusters of the average linkage clustering, None for no clustering 
+        sectors: dictionary/ series of sector per ticker, None for no sector constraint 
+        '''
+        
+        self.prefilter = {'top_k': top_k, 'min_corr': min_corr, 'num_clusters': num_clusters, 'sectors': sectors}
+    
+    def clear_prefilter(self):
+        '''
+        Function to switch the pre-filter off, all pairs are tested again 
+        '''
+        
+        self.prefilter = None
+    
+    def set_progress(self, progress=None, cancel_event=None):
+        '''
+        Function to set the progress callback and the cancel flag checked by the screening loops 
+        
+        Parameters:
+        -----------
+        progress: callable taking the number of tested pairs, the number of pairs and a dictionary 
+                  of the cointegrated pairs found since the previous call, None for no reporting 
+        cancel_event: threading.Event, the screening stops after the current chunk once it is set 
+        '''
+        
+        self.progress = progress
+        self.cancel_event = cancel_event
+    
+    def report_progress(self, num_tested, num_pairs, new_pairs):
+        '''
+        Function to report the screening progress after a chunk of pairs, raising ScreeningCancelled if cancelled 
+        
+        Parameters:
+        -----------
+        num_tested: number of pairs tested so far 
+        num_pairs: number of pairs to test 
+        new_pairs: dictionary of cointegrated pairs of the chunk 
+        '''
+        
+        if self.progress is not None:
+            self.progress(num_tested, num_pairs, new_pairs)
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ScreeningCancelled('Screening cancelled after {} of {} pairs'.format(num_tested, num_pairs))
+    
+    def store_pairs(self, tickers, chunk_res):
+        '''
+        Function to add the cointegrated pairs of a chunk of batched/ parallel tests to coint_pairs 
+        
+        Parameters:
+        -----------
+        tickers: list of tickers indexed by the test results 
+        chunk_res: list of (independent index, dependent index, hedge ratio, half-life, residual, test statistics) 
+        
+        Returns
+        -------
+        dictionary of the cointegrated pairs of the chunk 
+        '''
+        
+        new_pairs = {}
+        for indep_idx, dep_idx, hedge_ratio, half_life, spread, adf_stat in chunk_res:
+            key_pair = (tickers[indep_idx], tickers[dep_idx])
+            self.residual_stats[key_pair] = adf_stat
+            new_pairs[key_pair] = self.coint_pairs[key_pair] = [hedge_ratio, half_life, pd.Series(spread)]
+        return new_pairs
+    
+    def candidate_pairs(self, corr, tickers, lazy=False):
+        '''
+        Function to select the pairs of tickers passed on to the cointegration tests 
+        
+        Parameters:
+        -----------
+        corr: log price correlation matrix of the tickers 
+        tickers: list of tickers 
+        lazy: return None instead of the full pair list when there is no pre-filter, pairs are then generated by pair_chunks 
+        
+        Returns
+        -------
+        row and column indices of the candidate pairs (upper-triangular, i < j)
+        '''
+        
+        start_time = time.perf_counter()
+        num_tickers = len(tickers)
+        total_pairs = num_tickers * (num_tickers - 1) // 2
+        if lazy and self.prefilter is None:
+            self.prefilter_report = {'total_pairs': total_pairs, 'candidate_pairs': total_pairs, 'pruned_pairs': 0, 
+                                     'prefilter_time': time.perf_counter() - start_time}
+            return None
+        rows, cols = np.triu_indices(num_tickers, k=1)
+        
+        if self.prefilter is not None and len(rows):
+            keep = np.ones(len(rows), dtype=bool)
+            top_k, min_corr = self.prefilter['top_k'], self.prefilter['min_corr']
+            num_clusters, sectors = self.prefilter['num_clusters'], self.prefilter['sectors']
+            
+            if top_k is not None and top_k < num_tickers - 1:
+                neighbors = self.top_correlated(corr, top_k)
+                is_neighbor = np.zeros((num_tickers, num_tickers), dtype=bool)
+                is_neighbor[np.arange(num_tickers)[:, None], neighbors] = True
+                keep &= is_neighbor[rows, cols] | is_neighbor[cols, rows]
+            if min_corr is not None:
+                keep &= corr[rows, cols] >= min_corr
+            if num_clusters is not None and num_tickers > 2:
+                dist = np.sqrt(np.clip(2 * (1 - corr), 0, None))
+                np.fill_diagonal(dist, 0)
+                labels = fcluster(linkage(squareform(dist, checks=False), method='average'), num_clusters, criterion='maxclust')
+                keep &= labels[rows] == labels[cols]
+            if sectors is not None:
+                sector = np.array([str(sectors.get(ticker)) for ticker in tickers])
+                keep &= sector[rows] == sector[cols]
+            rows, cols = rows[keep], cols[keep]
+        
+        self.prefilter_report = {
+            'total_pairs': total_pairs,
+            'candidate_pairs': len(rows),
+            'pruned_pairs': total_pairs - len(rows),
+            'prefilter_time': time.perf_counter() - start_time
+        }
+        return rows, cols
+    
+    def update_prefilter_report(self, screen_time):
+        '''
+        Function to complete the pre-filter report with the screening time and the estimated time saved 
+        
+        The time saved extrapolates the time per tested pair to the pruned pairs, net of the pre-filter time 
+        
+        Parameters:
+        -----------
+        screen_time: time spent on the cointegration tests of the candidate pairs 
+        
+        Returns
+        -------
+        dictionary of the pre-filter report 
+        '''
+        
+        report = self.prefilter_report
+        report['screen_time'] = screen_time
+        time_per_pair = screen_time / report['candidate_pairs'] if report['candidate_pairs'] else 0.0
+        report['time_saved'] = report['pruned_pairs'] * time_per_pair - report['prefilter_time']
+        report['pruned_pct'] = report['pruned_pairs'] / report['total_pairs'] if report['total_pairs'] else 0.0
+        return report
     
     def adf_test(self, time_series, max_lag=None):
         '''
@@ -82,6 +307,33 @@ class CointModel(object):
         half_life = -np.log(2)/ lambda_val
         return half_life
     
+    def residual_coint_test(self, ticker1_log_price, ticker2_log_price):
+        '''
+        Function to carry out the residual ADF tests of both regressions of a pair of I(1) tickers 
+        
+        Parameters:
+        -----------
+        ticker1_log_price: log price series of 1st ticker 
+        ticker2_log_price: log price series of 2nd ticker 
+        
+        Returns
+        -------
+        None if the pair is not cointegrated, else tuple of orientation (1 if the 1st ticker is the 
+        independent one, 2 otherwise), hedge ratio, half-life, residual, test statistics 
+        '''
+        
+        adf_pass1, p_val1, hedge_ratio1, reg_results1, spread1, adf_stat1, test_stat1 = self.residual_adf(ticker1_log_price, ticker2_log_price)
+        adf_pass2, p_val2, hedge_ratio2, reg_results2, spread2, adf_stat2, test_stat2 = self.residual_adf(ticker2_log_price, ticker1_log_price)
+
+        if adf_pass1 and adf_pass2:
+            if p_val1 < p_val2:
+                adf_stat1['Test Stat'] = test_stat1
+                return 1, hedge_ratio1, self.half_life(reg_results1), spread1, adf_stat1
+            else:
+                adf_stat2['Test Stat'] = test_stat2
+                return 2, hedge_ratio2, self.half_life(reg_results2), spread2, adf_stat2
+        return None
+    
     def coint_test(self, ticker1_id, ticker2_id):
         '''
         Function to carry out Engle-Granger Cointegration test for a pair of tickers 
@@ -96,48 +348,654 @@ class CointModel(object):
         cointegration result, tuple of cointegrated pair's key info 
         '''
         
-        adf_ticker1_first_diff, _, _, _, _ = self.adf_test(self.data.get('first_diff')[ticker1_id])
-        adf_ticker2_first_diff, _, _, _, _ = self.adf_test(self.data.get('first_diff')[ticker2_id])
+        adf_ticker1_first_diff = self.is_integrated(ticker1_id)
+        adf_ticker2_first_diff = self.is_integrated(ticker2_id)
         
         if adf_ticker1_first_diff == True and adf_ticker2_first_diff == True:
             ticker1_log_price = self.data.get('log_price')[ticker1_id]
             ticker2_log_price = self.data.get('log_price')[ticker2_id]
-            adf_pass1, p_val1, hedge_ratio1, reg_results1, spread1, adf_stat1, test_stat1 = self.residual_adf(ticker1_log_price, ticker2_log_price)
-            adf_pass2, p_val2, hedge_ratio2, reg_results2, spread2, adf_stat2, test_stat2 = self.residual_adf(ticker2_log_price, ticker1_log_price)
+            coint_res = self.residual_coint_test(ticker1_log_price, ticker2_log_price)
 
-            if adf_pass1 and adf_pass2:
-                if p_val1 < p_val2:
-                    self.residual_stats[(ticker1_id, ticker2_id)] = adf_stat1
-                    self.residual_stats[(ticker1_id, ticker2_id)]['Test Stat'] = test_stat1
-                    return True, (ticker1_id, ticker2_id, hedge_ratio1, self.half_life(reg_results1), spread1)
-                else:
-                    self.residual_stats[(ticker2_id, ticker1_id)] = adf_stat2
-                    self.residual_stats[(ticker2_id, ticker1_id)]['Test Stat'] = test_stat2
-                    return True, (ticker2_id, ticker1_id, hedge_ratio2, self.half_life(reg_results2), spread2)
+            if coint_res is not None:
+                orientation, hedge_ratio, half_life, spread, adf_stat = coint_res
+                key_pair = (ticker1_id, ticker2_id) if orientation == 1 else (ticker2_id, ticker1_id)
+                self.residual_stats[key_pair] = adf_stat
+                return True, key_pair + (hedge_ratio, half_life, spread)
         return False, None
     
-    def screen_univ(self):
+    def screen_univ(self, vectorized=True, workers=None, top_k=None, rank_by='p_value'):
         '''
         Function to carry out Cointegration screening for an universe 
         
+        Parameters:
+        -----------
+        vectorized: use the batched screening engine instead of the pair by pair loop 
+        workers: number of worker processes for the pair by pair tests, None or 1 to stay serial 
+        top_k: keep only the best top_k cointegrated pairs with the streaming batched engine, None to keep all 
+        rank_by: ranking of the top_k pairs, 'p_value' or 'half_life' (the other one breaks ties) 
+        
         Returns
         -------
         dictionary of cointegrated pairs
         '''
         
-        univ_tickers = self.data.get('univ_tickers')
-        lst_pairs = [(univ_tickers[i], univ_tickers[j]) for i in range(len(univ_tickers)) for j in range(i+1,len(univ_tickers))]
+        if top_k is not None:
+            return self.screen_univ_top_k(top_k, rank_by)
+        if workers is not None and workers > 1:
+            return self.screen_univ_parallel(workers)
+        if vectorized:
+            return self.screen_univ_batched()
         
-        self.coint_pairs, self.residual_stats = {}, {}
-        for pair in lst_pairs:
-            ticker1_id, ticker2_id = pair[0], pair[1]
+        univ_tickers = self.eligible_tickers()
+        rows, cols = self.candidate_pairs(self.ticker_correlation(univ_tickers), univ_tickers)
+        
+        start_time = time.perf_counter()
+        self.coint_pairs, self.residual_stats, new_pairs = {}, {}, {}
+        for num_tested, (i, j) in enumerate(zip(rows, cols), 1):
+            ticker1_id, ticker2_id = univ_tickers[i], univ_tickers[j]
             coint_pass, coint_res = self.coint_test(ticker1_id, ticker2_id)
             
             if coint_pass:
-                self.coint_pairs[(coint_res[0], coint_res[1])] = [coint_res[2], coint_res[3], coint_res[4]]
+                key_pair = (coint_res[0], coint_res[1])
+                new_pairs[key_pair] = self.coint_pairs[key_pair] = [coint_res[2], coint_res[3], coint_res[4]]
+            if num_tested % self.chunk_size == 0 or num_tested == len(rows):
+                self.report_progress(num_tested, len(rows), new_pairs)
+                new_pairs = {}
+        self.update_prefilter_report(time.perf_counter() - start_time)
         
         return self.coint_pairs 
     
+    def ticker_correlation(self, tickers):
+        '''
+        Function to get the log price correlation matrix of a list of tickers, skipped when no pre-filter is set 
+        
+        Parameters:
+        -----------
+        tickers: list of tickers 
+        
+        Returns
+        -------
+        correlation matrix, None without pre-filter 
+        '''
+        
+        if self.prefilter is None:
+            return None
+        return self.correlation_matrix(self.data.get('log_price')[tickers].values.astype(np.float64))
+    
+    def screen_univ_parallel(self, workers):
+        '''
+        Function to carry out Cointegration screening for an universe on a pool of worker processes 
+        
+        The upper-triangular pair list is split into chunks and the log price matrix is shared with the 
+        workers once through shared memory. Chunks are merged back in submission order, so the result 
+        matches the serial screening. Falls back to the serial loop if the pool cannot be started. 
+        On cancellation the chunks not yet started are dropped, running chunks are left to finish. 
+        
+        Parameters:
+        -----------
+        workers: number of worker processes 
+        
+        Returns
+        -------
+        dictionary of cointegrated pairs
+        '''
+        
+        univ_tickers = self.eligible_tickers()
+        rows, cols = self.candidate_pairs(self.ticker_correlation(univ_tickers), univ_tickers)
+        chunk_size = max(1, min(self.chunk_size, -(-len(rows) // (workers * 4))))
+        chunks = [np.column_stack([rows[i:i + chunk_size], cols[i:i + chunk_size]]) for i in range(0, len(rows), chunk_size)]
+        
+        self.coint_pairs, self.residual_stats = {}, {}
+        if not chunks:
+            self.update_prefilter_report(0.0)
+            return self.coint_pairs
+        
+        start_time = time.perf_counter()
+        log_price = np.ascontiguousarray(self.data.get('log_price')[univ_tickers].values, dtype=np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=log_price.nbytes)
+        try:
+            np.ndarray(log_price.shape, dtype=np.float64, buffer=shm.buf)[:] = log_price
+            initargs = (shm.name, log_price.shape, self.sig_lvl, self.residual_lag)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+            try:
+                num_tested = 0
+                for chunk, chunk_res in zip(chunks, executor.map(_screen_pair_chunk, chunks)):
+                    num_tested += len(chunk)
+                    self.report_progress(num_tested, len(rows), self.store_pairs(univ_tickers, chunk_res))
+            finally:
+                executor.shutdown(cancel_futures=True)
+        except (OSError, BrokenProcessPool):
+            return self.screen_univ(vectorized=False)
+        finally:
+            shm.close()
+            shm.unlink()
+        self.update_prefilter_report(time.perf_counter() - start_time)
+        
+        return self.coint_pairs 
+    
+    def batched_ols(self, y, X):
+        '''
+        Function to fit a stack of small OLS regressions in one least-squares pass 
+        
+        Parameters:
+        -----------
+        y: array of dependent series, one row per regression (m x nobs)
+        X: array of regressors, one matrix per regression (m x nobs x k)
+        
+        Returns
+        -------
+        coefficients (m x k), sum of squared residuals (m), t-statistics (m x k)
+        '''
+        
+        nobs, k = X.shape[1], X.shape[2]
+        Xt = X.transpose(0, 2, 1)
+        xtx = Xt @ X
+        xty = (Xt @ y[:, :, None])[:, :, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            try:
+                xtx_inv = np.linalg.inv(xtx)
+            except np.linalg.LinAlgError:
+                xtx_inv = np.linalg.pinv(xtx)
+            params = (xtx_inv @ xty[:, :, None])[:, :, 0]
+            resid = y - (X @ params[:, :, None])[:, :, 0]
+            ssr = np.einsum('mt,mt->m', resid, resid)
+            sigma2 = ssr / (nobs - k)
+            bse = np.sqrt(sigma2[:, None] * np.diagonal(xtx_inv, axis1=1, axis2=2))
+            tvalues = params / bse
+        return params, ssr, tvalues
+    
+    def batched_adf(self, residuals, max_lag=None):
+        '''
+        Function to carry out the ADF test on a stack of residual series at once 
+        
+        Mirrors adfuller(maxlag=max_lag, autolag='AIC', regression='c'): the lag order 
+        is picked by AIC on a common sample and the level coefficient is then refitted with the 
+        chosen lag on the longest available sample. 
+        
+        Parameters:
+        -----------
+        residuals: array of residual series, one row per series (m x T)
+        max_lag: maximum lag order, defaults to self.residual_lag 
+        
+        Returns
+        -------
+        dictionary with the level coefficient, test statistics, number of observations and chosen lag 
+        '''
+        
+        max_lag = self.residual_lag if max_lag is None else max_lag
+        num_series, num_obs = residuals.shape
+        resid_diff = np.diff(residuals, axis=1)
+        
+        def design(lag):
+            # columns: lagged level, lagged differences, constant 
+            nobs = num_obs - 1 - lag
+            X = np.empty((num_series, nobs, lag + 2))
+            X[:, :, 0] = residuals[:, lag:-1]
+            for k in range(1, lag + 1):
+                X[:, :, k] = resid_diff[:, lag - k:-k]
+            X[:, :, -1] = 1.0
+            return X
+        
+        # lag selection on the common sample 
+        best_lag = np.zeros(num_series, dtype=int)
+        if max_lag > 0:
+            y_short = resid_diff[:, max_lag:]
+            X_full = design(max_lag)
+            nobs = y_short.shape[1]
+            aics = []
+            for lag in range(max_lag + 1):
+                cols = list(range(lag + 1)) + [max_lag + 1]
+                _, ssr, _ = self.batched_ols(y_short, X_full[:, :, cols])
+                with np.errstate(divide='ignore'):
+                    aics.append(nobs * np.log(ssr / nobs) + 2 * (lag + 2))
+            best_lag = np.argmin(np.vstack(aics), axis=0)
+        
+        # refit with the selected lag 
+        gamma, test_stat, used_obs = np.full(num_series, np.nan), np.full(num_series, np.nan), np.zeros(num_series, dtype=int)
+        for lag in np.unique(best_lag):
+            idx = np.flatnonzero(best_lag == lag)
+            params, _, tvalues = self.batched_ols(resid_diff[idx, lag:], design(lag)[idx])
+            gamma[idx], test_stat[idx] = params[:, 0], tvalues[:, 0]
+            used_obs[idx] = num_obs - 1 - lag
+        
+        return {'gamma': gamma, 'test_stat': test_stat, 'nobs': used_obs, 'lag': best_lag}
+    
+    def critical_values(self, nobs):
+        '''
+        Function to get the MacKinnon critical values of the residual ADF test 
+        
+        Parameters:
+        -----------
+        nobs: number of observations used in the ADF regression 
+        
+        Returns
+        -------
+        dictionary of critical values 
+        '''
+        
+        crit = mackinnoncrit(N=1, regression='c', nobs=nobs)
+        return {'1%': crit[0], '5%': crit[1], '10%': crit[2]}
+    
+    def batched_unit_root(self, series):
+        '''
+        Function to carry out the ADF test with adfuller's default lag search on a stack of series 
+        
+        Parameters:
+        -----------
+        series: array of time series, one row per series (m x T)
+        
+        Returns
+        -------
+        array of ADF results 
+        '''
+        
+        num_obs = series.shape[1]
+        max_lag = min(num_obs // 2 - 2, int(np.ceil(12.0 * np.power(num_obs / 100.0, 1 / 4.0))))
+        adf_res = self.batched_adf(series, max_lag)
+        crit_lvl = np.array([self.critical_values(nobs).get(self.sig_lvl) for nobs in adf_res['nobs']], dtype=np.float64)
+        return adf_res['test_stat'] < crit_lvl
+    
+    def pair_chunks(self, num_tickers):
+        '''
+        Function to generate all upper-triangular pairs (i < j) chunk_size pairs at a time, without materializing the pair list 
+        
+        Parameters:
+        -----------
+        num_tickers: number of tickers 
+        
+        Returns
+        -------
+        generator of row and column indices 
+        '''
+        
+        # pair k of the row-major upper triangle sits in the row i with row_start[i] <= k < row_start[i + 1] 
+        rows = np.arange(num_tickers, dtype=np.int64)
+        row_start = rows * num_tickers - rows * (rows + 1) // 2
+        num_pairs = num_tickers * (num_tickers - 1) // 2
+        for start in range(0, num_pairs, self.chunk_size):
+            k = np.arange(start, min(start + self.chunk_size, num_pairs), dtype=np.int64)
+            idx1 = np.searchsorted(row_start, k, side='right') - 1
+            yield idx1, k - row_start[idx1] + idx1 + 1
+    
+    def batched_pair_screen(self, centered, cov, pairs=None, on_chunk=None):
+        '''
+        Function to carry out the Engle-Granger test on all pairs of a block of tickers with NumPy matrix algebra 
+        
+        Hedge ratios of all pairs come from a single co-moment matrix of the centered log prices, 
+        and the residual ADF regressions are solved chunk_size pairs at a time. 
+        
+        Parameters:
+        -----------
+        centered: array of centered log prices, one row per ticker (num tickers x num days)
+        cov: co-moment matrix of the centered log prices (num tickers x num tickers)
+        pairs: row and column indices of the pairs to test, all pairs (generated lazily) by default 
+        on_chunk: callable taking the number of tested pairs, the number of pairs and the results of each chunk, 
+                  results are then handed to on_chunk only instead of being returned 
+        
+        Returns
+        -------
+        list of (independent index, dependent index, hedge ratio, half-life, residual, test statistics) 
+        for the cointegrated pairs 
+        '''
+        
+        var = np.diag(cov).copy()
+        crit_vals, results = {}, []
+        
+        if pairs is None:
+            total_pairs = len(centered) * (len(centered) - 1) // 2
+            chunks = self.pair_chunks(len(centered))
+        else:
+            rows, cols = pairs
+            total_pairs = len(rows)
+            chunks = ((rows[start:start + self.chunk_size], cols[start:start + self.chunk_size]) for start in range(0, len(rows), self.chunk_size))
+        num_tested = 0
+        for idx1, idx2 in chunks:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # 1st orientation regresses idx2 on idx1, 2nd orientation regresses idx1 on idx2 
+                hedge_ratios = np.concatenate([cov[idx1, idx2] / var[idx1], cov[idx1, idx2] / var[idx2]])
+            indep, dep = np.concatenate([idx1, idx2]), np.concatenate([idx2, idx1])
+            residuals = centered[dep] - hedge_ratios[:, None] * centered[indep]
+            adf_res = self.batched_adf(residuals)
+            
+            for nobs in np.unique(adf_res['nobs']):
+                if nobs not in crit_vals:
+                    crit_vals[nobs] = self.critical_values(nobs)
+            crit_lvl = np.array([crit_vals[nobs].get(self.sig_lvl) for nobs in adf_res['nobs']], dtype=np.float64)
+            adf_pass = adf_res['test_stat'] < crit_lvl
+            num_pairs = len(idx1)
+            both_pass = np.flatnonzero(adf_pass[:num_pairs] & adf_pass[num_pairs:])
+            chunk_res = []
+            
+            for k in both_pass:
+                p_val1 = mackinnonp(adf_res['test_stat'][k], regression='c', N=1)
+                p_val2 = mackinnonp(adf_res['test_stat'][k + num_pairs], regression='c', N=1)
+                best = k if p_val1 < p_val2 else k + num_pairs
+                adf_stat = dict(crit_vals[adf_res['nobs'][best]])
+                adf_stat['Test Stat'] = adf_res['test_stat'][best]
+                chunk_res.append((indep[best], dep[best], hedge_ratios[best], -np.log(2)/ adf_res['gamma'][best], 
+                                  residuals[best].copy(), adf_stat))
+            num_tested += num_pairs
+            if on_chunk is not None:
+                on_chunk(num_tested, total_pairs, chunk_res)
+            else:
+                results.extend(chunk_res)
+        return results
+    
+    def screen_univ_batched(self):
+        '''
+        Function to carry out Cointegration screening for an universe with NumPy matrix algebra 
+        
+        Returns
+        -------
+        dictionary of cointegrated pairs
+        '''
+        
+        log_price = self.data.get('log_price')
+        tickers = [ticker for ticker in self.eligible_tickers() if not log_price[ticker].isna().any()]
+        
+        self.coint_pairs, self.residual_stats = {}, {}
+        if len(tickers) < 2:
+            return self.coint_pairs
+        
+        log_price = log_price[tickers].values.astype(np.float64)
+        centered = (log_price - log_price.mean(axis=0)).T.copy()
+        cov = centered @ centered.T
+        pairs = self.candidate_pairs(self.cov_to_corr(cov) if self.prefilter is not None else None, tickers, lazy=True)
+        
+        start_time = time.perf_counter()
+        self.batched_pair_screen(centered, cov, pairs, on_chunk=lambda num_tested, num_pairs, chunk_res:
+                                 self.report_progress(num_tested, num_pairs, self.store_pairs(tickers, chunk_res)))
+        self.update_prefilter_report(time.perf_counter() - start_time)
+        
+        return self.coint_pairs 
+    
+    def screen_univ_top_k(self, top_k=100, rank_by='p_value'):
+        '''
+        Function to carry out Cointegration screening for an universe keeping only the best top_k pairs 
+        
+        Pairs are generated chunk by chunk and the cointegrated ones go through a bounded heap 
+        ranked by ADF p-value or half-life, without their residuals. Residuals are recomputed for 
+        the survivors only, so memory does not grow with the number of pairs of the universe. 
+        
+        Parameters:
+        -----------
+        top_k: number of pairs kept 
+        rank_by: 'p_value' or 'half_life', lowest first, the other one breaks ties 
+        
+        Returns
+        -------
+        dictionary of the best top_k cointegrated pairs, best first 
+        '''
+        
+        if rank_by not in ('p_value', 'half_life'):
+            raise ValueError("rank_by should be 'p_value' or 'half_life'")
+        
+        log_price = self.data.get('log_price')
+        tickers = [ticker for ticker in self.eligible_tickers() if not log_price[ticker].isna().any()]
+        
+        self.coint_pairs, self.residual_stats, self.num_passed = {}, {}, 0
+        if len(tickers) < 2:
+            return self.coint_pairs
+        
+        log_price = log_price[tickers].values.astype(np.float64)
+        centered = (log_price - log_price.mean(axis=0)).T.copy()
+        cov = centered @ centered.T
+        pairs = self.candidate_pairs(self.cov_to_corr(cov) if self.prefilter is not None else None, tickers, lazy=True)
+        
+        # min-heap on the negated ranking, heap[0] is the worst pair kept 
+        heap, tie = [], count()
+        def keep_best(num_tested, num_pairs, chunk_res):
+            for indep_idx, dep_idx, hedge_ratio, half_life, spread, adf_stat in chunk_res:
+                p_value = mackinnonp(adf_stat['Test Stat'], regression='c', N=1)
+                rank = (p_value, half_life) if rank_by == 'p_value' else (half_life, p_value)
+                entry = (-rank[0], -rank[1], -next(tie), indep_idx, dep_idx, hedge_ratio, half_life, adf_stat)
+                if len(heap) < top_k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+            self.num_passed += len(chunk_res)
+            self.report_progress(num_tested, num_pairs, {})
+        
+        start_time = time.perf_counter()
+        self.batched_pair_screen(centered, cov, pairs, on_chunk=keep_best)
+        for entry in sorted(heap, reverse=True):
+            indep_idx, dep_idx, hedge_ratio, half_life, adf_stat = entry[3:]
+            key_pair = (tickers[indep_idx], tickers[dep_idx])
+            self.residual_stats[key_pair] = adf_stat
+            self.coint_pairs[key_pair] = [hedge_ratio, half_life, pd.Series(centered[dep_idx] - hedge_ratio * centered[indep_idx])]
+        self.update_prefilter_report(time.perf_counter() - start_time)
+        
+        return self.coint_pairs 
+    
+    def walk_forward(self, formation_days=252, trading_days=21, expanding=False):
+        '''
+        Function to carry out Cointegration screening on successive formation windows 
+        
+        Each formation window is screened with data up to its last day only, and the pairs found 
+        are meant to be traded on the following trading window. The OLS sufficient statistics 
+        (sum and cross-product of the log prices) are updated as rows enter and leave the window 
+        instead of being recomputed from scratch. 
+        
+        Parameters:
+        -----------
+        formation_days: number of days of the (initial) formation window 
+        trading_days: number of days traded after each formation window, also the step size 
+        expanding: keep the start of the formation window fixed instead of rolling it 
+        
+        Returns
+        -------
+        list of dictionaries with the formation/ trading windows (day indices, end excluded), 
+        the cointegrated pairs, their intercepts, test statistics and pre-filter report 
+        '''
+        
+        tickers = self.data.get('univ_tickers')
+        log_price = self.data.get('log_price')[tickers].values.astype(np.float64)
+        price = self.data.get('price')[tickers].values.astype(np.float64)
+        num_days, num_tickers = log_price.shape
+        
+        # shift by the first valid price to keep the cross-products well conditioned 
+        ref_price = np.nan_to_num(log_price[np.argmax(~np.isnan(log_price), axis=0), np.arange(num_tickers)])
+        missing = np.isnan(log_price)
+        shifted = np.where(missing, 0.0, log_price - ref_price)
+        num_missing = np.concatenate([np.zeros((1, num_tickers)), np.cumsum(missing, axis=0)])
+        
+        col_sum, cross_prod = np.zeros(num_tickers), np.zeros((num_tickers, num_tickers))
+        win_start, win_end = 0, 0
+        self.wf_windows = []
+        
+        for form_end in range(formation_days, num_days, trading_days):
+            form_start = 0 if expanding else form_end - formation_days
+            # rank-one updates of the sufficient statistics for rows entering and leaving the window 
+            new_rows, old_rows = shifted[win_end:form_end], shifted[win_start:form_start]
+            col_sum += new_rows.sum(axis=0) - old_rows.sum(axis=0)
+            cross_prod += new_rows.T @ new_rows - old_rows.T @ old_rows
+            win_start, win_end = form_start, form_end
+            num_obs = form_end - form_start
+            
+            valid = np.flatnonzero(num_missing[form_end] == num_missing[form_start])
+            first_diff = np.diff(price[form_start:form_end, valid], axis=0).T
+            valid = valid[self.batched_unit_root(first_diff)]
+            
+            mean = col_sum[valid]/ num_obs
+            cov = cross_prod[np.ix_(valid, valid)] - num_obs * np.outer(mean, mean)
+            centered = shifted[form_start:form_end, valid].T - mean[:, None]
+            
+            window = {'formation': (form_start, form_end), 'trading': (form_end, min(form_end + trading_days, num_days)),
+                      'coint_pairs': {}, 'intercepts': {}, 'residual_stats': {}}
+            pairs = self.candidate_pairs(self.cov_to_corr(cov) if self.prefilter is not None else None, [tickers[i] for i in valid])
+            start_time = time.perf_counter()
+            for indep_idx, dep_idx, hedge_ratio, half_life, spread, adf_stat in self.batched_pair_screen(centered, cov, pairs):
+                indep_col, dep_col = valid[indep_idx], valid[dep_idx]
+                key_pair = (tickers[indep_col], tickers[dep_col])
+                window['coint_pairs'][key_pair] = [hedge_ratio, half_life, pd.Series(spread)]
+                window['intercepts'][key_pair] = (mean[dep_idx] + ref_price[dep_col]) - hedge_ratio * (mean[indep_idx] + ref_price[indep_col])
+                window['residual_stats'][key_pair] = adf_stat
+            # the report of the model is the one of the last window, each window keeps its own 
+            window['prefilter_report'] = dict(self.update_prefilter_report(time.perf_counter() - start_time))
+            self.wf_windows.append(window)
+        
+        return self.wf_windows
+    
+    def correlation_matrix(self, log_price):
+        '''
+        Function to compute the correlation matrix of the log price series in one matrix product 
+        
+        Parameters:
+        -----------
+        log_price: array of log prices, one column per ticker (num days x num tickers)
+        
+        Returns
+        -------
+        correlation matrix (num tickers x num tickers)
+        '''
+        
+        centered = log_price - log_price.mean(axis=0)
+        return self.cov_to_corr(centered.T @ centered)
+    
+    def cov_to_corr(self, cov):
+        '''
+        Function to scale a co-moment matrix to a correlation matrix, undefined correlations are set to 0 
+        '''
+        
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        return np.nan_to_num(corr)
+    
+    def top_correlated(self, corr, num_neighbors):
+        '''
+        Function to get the most correlated tickers of every ticker 
+        
+        Parameters:
+        -----------
+        corr: correlation matrix (num tickers x num tickers)
+        num_neighbors: number of neighbours kept per ticker 
+        
+        Returns
+        -------
+        array of column indices of the neighbours, most correlated first (num tickers x num neighbours)
+        '''
+        
+        num_neighbors = min(num_neighbors, len(corr) - 1)
+        if num_neighbors < 1:
+            return np.zeros((len(corr), 0), dtype=np.int64)
+        scores = corr.copy()
+        np.fill_diagonal(scores, -np.inf)
+        neighbors = np.argpartition(-scores, num_neighbors - 1, axis=1)[:, :num_neighbors]
+        order = np.argsort(-np.take_along_axis(scores, neighbors, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(neighbors, order, axis=1)
+    
+    def candidate_baskets(self, corr, basket_size, num_neighbors):
+        '''
+        Function to pre-select the baskets to test, each ticker is only grouped with its most correlated tickers 
+        
+        Parameters:
+        -----------
+        corr: correlation matrix (num tickers x num tickers)
+        basket_size: number of legs per basket 
+        num_neighbors: number of neighbours of each ticker considered for its baskets 
+        
+        Returns
+        -------
+        sorted list of baskets, tuples of column indices 
+        '''
+        
+        baskets = set()
+        for i, neighbors in enumerate(self.top_correlated(corr, num_neighbors)):
+            for others in combinations(neighbors.tolist(), basket_size - 1):
+                baskets.add(tuple(sorted((i,) + others)))
+        return sorted(baskets)
+    
+    def johansen_test(self, log_prices, method='trace'):
+        '''
+        Function to carry out Johansen Cointegration test on a basket of tickers 
+        
+        Parameters:
+        -----------
+        log_prices: array of log prices of the basket (num days x num legs)
+        method: 'trace', 'eigen' or 'both' statistics used to reject the no cointegration hypothesis 
+        
+        Returns
+        -------
+        cointegration result, weights of the first cointegrating vector, test statistics 
+        '''
+        
+        crit_col = {'10%': 0, '5%': 1, '1%': 2}[self.sig_lvl]
+        joh_res = coint_johansen(log_prices, det_order=0, k_ar_diff=self.residual_lag)
+        trace_rank = int(np.sum(np.cumprod(joh_res.lr1 > joh_res.cvt[:, crit_col])))
+        eigen_rank = int(np.sum(np.cumprod(joh_res.lr2 > joh_res.cvm[:, crit_col])))
+        
+        if method == 'trace':
+            coint_pass = trace_rank > 0
+        elif method == 'eigen':
+            coint_pass = eigen_rank > 0
+        else:
+            coint_pass = trace_rank > 0 and eigen_rank > 0
+        
+        # normalise the weights on the first leg, like the dependent ticker of a pair 
+        weights = joh_res.evec[:, 0] / joh_res.evec[0, 0]
+        joh_stat = {
+            'Trace Stat': joh_res.lr1[0], 'Trace Crit': joh_res.cvt[0, crit_col], 'Trace Rank': trace_rank,
+            'Eigen Stat': joh_res.lr2[0], 'Eigen Crit': joh_res.cvm[0, crit_col], 'Eigen Rank': eigen_rank
+        }
+        return coint_pass, weights, joh_stat
+    
+    def screen_baskets(self, basket_size=3, num_neighbors=5, method='trace'):
+        '''
+        Function to carry out Johansen Cointegration screening of baskets of tickers 
+        
+        Candidate baskets are drawn from the most correlated tickers of each ticker, so only 
+        num tickers x C(num_neighbors, basket_size - 1) baskets are tested instead of all 
+        C(num tickers, basket_size) combinations. The half-life of each basket comes from the 
+        ADF regression of its residual, baskets whose residual does not mean-revert are dropped. 
+        
+        Parameters:
+        -----------
+        basket_size: number of legs per basket 
+        num_neighbors: number of neighbours of each ticker considered for its baskets 
+        method: 'trace', 'eigen' or 'both' Johansen statistics 
+        
+        Returns
+        -------
+        dictionary of cointegrated baskets, keyed by the tuple of tickers, with the weights 
+        (first leg normalised to 1), half-life and residual 
+        '''
+        
+        log_price = self.data.get('log_price')
+        tickers = [ticker for ticker in self.eligible_tickers() if not log_price[ticker].isna().any()]
+        
+        self.coint_baskets, self.basket_stats = {}, {}
+        if len(tickers) < basket_size:
+            return self.coint_baskets
+        
+        log_price = log_price[tickers].values.astype(np.float64)
+        baskets = self.candidate_baskets(self.correlation_matrix(log_price), basket_size, num_neighbors)
+        self.num_candidate_baskets = len(baskets)
+        
+        found = []
+        for basket in baskets:
+            try:
+                coint_pass, weights, joh_stat = self.johansen_test(log_price[:, basket], method)
+            except np.linalg.LinAlgError:
+                continue
+            if coint_pass:
+                found.append((basket, weights, joh_stat))
+        if not found:
+            return self.coint_baskets
+        
+        residuals = np.vstack([log_price[:, basket] @ weights for basket, weights, _ in found])
+        residuals -= residuals.mean(axis=1, keepdims=True)
+        adf_res = self.batched_adf(residuals)
+        
+        for k, (basket, weights, joh_stat) in enumerate(found):
+            if not adf_res['gamma'][k] < 0:
+                continue
+            key = tuple(tickers[i] for i in basket)
+            self.basket_stats[key] = joh_stat
+            self.coint_baskets[key] = [weights, -np.log(2)/ adf_res['gamma'][k], pd.Series(residuals[k])]
+        
+        return self.coint_baskets
+    
     
     
     
@@ -153,7 +1011,7 @@ class CointModel(object):
         dictionary of cointegrated pairs
         '''
         
-        univ_tickers = self.data.get('univ_tickers')
+        univ_tickers = self.eligible_tickers()
         lst_pairs = [(univ_tickers[i], univ_tickers[j]) for i in range(len(univ_tickers)) for j in range(i+1,len(univ_tickers))]
         
         self.coint_pairs, self.residual_stats = {}, {}
@@ -180,8 +1038,8 @@ class CointModel(object):
         cointegration result, tuple of cointegrated pair's key info 
         '''
         
-        adf_ticker1_first_diff, _, _, _, _ = self.adf_test(self.data.get('first_diff')[ticker1_id])
-        adf_ticker2_first_diff, _, _, _, _ = self.adf_test(self.data.get('first_diff')[ticker2_id])
+        adf_ticker1_first_diff = self.is_integrated(ticker1_id)
+        adf_ticker2_first_diff = self.is_integrated(ticker2_id)
         
         if adf_ticker1_first_diff == True and adf_ticker2_first_diff == True:
             ticker1_log_price = self.data.get('log_price')[ticker1_id]
@@ -197,4 +1055,45 @@ class CointModel(object):
                 self.residual_stats[(ticker2_id, ticker1_id)] = adf_stat2
                 self.residual_stats[(ticker2_id, ticker1_id)]['Test Stat'] = test_stat2
                 return True, (ticker2_id, ticker1_id, hedge_ratio2, self.half_life(reg_results2), spread2)
-        return False, None
\ No newline at end of file
+        return False, None
+
+
+# state of a screening worker process, set once by _init_worker 
+_worker_state = {}
+
+def _init_worker(shm_name, shape, sig_lvl, residual_lag):
+    '''
+    Function to attach a worker process to the shared log price matrix 
+    '''
+    
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name, track=False)
+    except TypeError:
+        # python < 3.13 has no track argument 
+        shm = shared_memory.SharedMemory(name=shm_name)
+    model = CointModel()
+    model.sig_lvl = sig_lvl
+    model.residual_lag = residual_lag
+    _worker_state['shm'] = shm
+    _worker_state['log_price'] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _worker_state['model'] = model
+
+def _screen_pair_chunk(pairs):
+    '''
+    Function to run the residual cointegration tests on a chunk of (i, j) column index pairs 
+    
+    Returns
+    -------
+    list of (independent index, dependent index, hedge ratio, half-life, residual values, test statistics) 
+    for the cointegrated pairs of the chunk 
+    '''
+    
+    log_price, model = _worker_state['log_price'], _worker_state['model']
+    results = []
+    for i, j in pairs:
+        coint_res = model.residual_coint_test(pd.Series(log_price[:, i]), pd.Series(log_price[:, j]))
+        if coint_res is not None:
+            orientation, hedge_ratio, half_life, spread, adf_stat = coint_res
+            indep_idx, dep_idx = (int(i), int(j)) if orientation == 1 else (int(j), int(i))
+            results.append((indep_idx, dep_idx, hedge_ratio, half_life, spread.values, adf_stat))
+    return results
@@ -0,0 +1,134 @@
+import numpy as np
+
+class CostModel(object):
+    '''
+    CostModel class for the trading frictions of the pairs backtest 
+    
+    Costs are charged per leg of a spread: a commission in bps of the traded notional, a fee per 
+    contract (futures of the Comdty universe), a borrow rate on the notional of the short legs 
+    while the position is held, and a slippage that grows with the participation in the daily 
+    volume: slippage_bps * (traded quantity/ volume) ** slippage_exponent of the traded notional. 
+    '''
+    
+    def __init__(self, leg_bps=0., fee_per_contract=0., multipliers=None, borrow_rate=0.,
+                 slippage_bps=0., slippage_exponent=0.5, volume=None, periods_per_year=252):
+        '''
+        Parameters:
+        -----------
+        leg_bps: commission in bps of the traded notional of each leg 
+        fee_per_contract: fee per traded contract 
+        multipliers: dictionary of contract size per ticker (units of price per contract), 1 by default 
+        borrow_rate: annual borrow rate on the notional of the short legs 
+        slippage_bps: slippage in bps of the traded notional when trading the whole daily volume 
+        slippage_exponent: exponent of the participation rate (0.5 for square-root impact) 
+        volume: dataframe of daily traded volume (dates x tickers), needed for slippage 
+        periods_per_year: number of trading days per year, for the daily borrow 
+        '''
+        
+        self.leg_bps = leg_bps
+        self.fee_per_contract = fee_per_contract
+        self.multipliers = multipliers or {}
+        self.borrow_rate = borrow_rate
+        self.slippage_bps = slippage_bps
+        self.slippage_exponent = slippage_exponent
+        self.volume = volume
+        self.periods_per_year = periods_per_year
+    
+    def scale_invariant(self):
+        '''
+        Function to check whether costs are proportional to the traded size, i.e. there is no slippage 
+        '''
+        
+        return not (self.slippage_bps and self.volume is not None)
+    
+    def bind(self, price, leg_idx, weights):
+        '''
+        Function to bind the cost model to the legs of the spreads of a backtest 
+        
+        Parameters:
+        -----------
+        price: dataframe of traded prices (dates x tickers) 
+        leg_idx: column index of each leg (num spreads x max num legs) 
+        weights: weight of each leg (num spreads x max num legs) 
+        
+        Returns
+        -------
+        LegCosts object used by spread_kernel 
+        '''
+        
+        multiplier = np.array([self.multipliers.get(ticker, 1.) for ticker in price.columns], dtype=np.float64)
+        volume = None
+        if self.slippage_bps and self.volume is not None:
+            volume = self.volume.reindex(index=price.index, columns=price.columns).values.astype(np.float64)
+        return LegCosts(self, price.values.astype(np.float64), leg_idx, weights, multiplier, volume)
+
+
+class LegCosts(object):
+    '''
+    LegCosts class computing the costs of many spreads at once for a day of the backtest kernel 
+    '''
+    
+    def __init__(self, model, price, leg_idx, weights, multiplier, volume):
+        self.model = model
+        self.price = price
+        self.leg_idx = leg_idx
+        self.weights = weights
+        self.multiplier = multiplier
+        self.volume = volume
+    
+    def quantities(self, i, idx, num_spread):
+        '''
+        Function to get the traded quantity and notional of every leg of the spreads idx on day i 
+        '''
+        
+        legs = self.leg_idx[idx]
+        quantity = num_spread[:, None] * np.abs(self.weights[idx])
+        return legs, quantity, quantity * self.price[i, legs]
+    
+    def execution(self, i, idx, num_spread):
+        '''
+        Function to get the cost of trading num_spread units of the spreads idx on day i 
+        
+        Parameters:
+        -----------
+        i: day index 
+        idx: indices of the traded spreads 
+        num_spread: number of units of each spread 
+        
+        Returns
+        -------
+        array of costs 
+        '''
+        
+        model = self.model
+        legs, quantity, notional = self.quantities(i, idx, num_spread)
+        cost = model.leg_bps / 1e4 * notional
+        if model.fee_per_contract:
+            cost = cost + model.fee_per_contract * quantity / self.multiplier[legs]
+        if self.volume is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                participation = np.nan_to_num(quantity / self.volume[i, legs], nan=0., posinf=0.)
+            cost = cost + model.slippage_bps / 1e4 * participation ** model.slippage_exponent * notional
+        return np.nansum(cost, axis=1)
+    
+    def holding(self, i, idx, pos, num_spread):
+        '''
+        Function to get the borrow cost of holding the positions pos of the spreads idx over day i 
+        
+        Parameters:
+        -----------
+        i: day index 
+        idx: indices of the open spreads 
+        pos: position of each spread (long: 1, short: -1) 
+        num_spread: number of units of each spread 
+        
+        Returns
+        -------
+        array of costs 
+        '''
+        
+        if not self.model.borrow_rate:
+            return np.zeros(len(idx))
+        legs, quantity, notional = self.quantities(i, idx, num_spread)
+        short = self.weights[idx] * pos[:, None] < 0
+        return self.model.borrow_rate / self.model.periods_per_year * np.nansum(np.where(short, notional, 0.), axis=1)
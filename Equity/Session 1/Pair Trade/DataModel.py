@@ -1,12 +1,44 @@
 import bql 
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+
+class DataFields(Mapping):
+    '''
+    Read-only dictionary of bql fields, derived fields are only computed when first accessed 
+    '''
+    
+    _keys = ('price', 'first_diff', 'log_price', 'univ_tickers', 'dates')
+    
+    def __init__(self, model):
+        self._model = model
+    
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self._model, key)
+    
+    def __iter__(self):
+        return iter(self._keys)
+    
+    def __len__(self):
+        return len(self._keys)
 
 class DataModel(object):
     '''
     DataModel class for retrieval of bql fields used by app
     '''
         
-    def __init__(self):
+    def __init__(self, store=None):
+        '''
+        Parameters:
+        -----------
+        store: PriceStore consulted before requesting prices from bql, None to always request everything 
+        '''
+        
         self._bq = bql.Service() 
+        self.store = store
+        self._first_diff, self._log_price = None, None
     
     def initialise_model(self, dict_univ, start_date, end_date):
         '''
@@ -20,6 +52,7 @@ class DataModel(object):
         '''
         
         value = list(filter(None,dict_univ['value']))
+        self.univ_key = '{}:{}'.format(dict_univ['type'], ','.join(v.strip() for v in value))
         if dict_univ['type'] == 'Index':
             self.univ = self._bq.univ.members(value)
         else:
@@ -28,32 +61,159 @@ class DataModel(object):
         self.start_date = start_date
         self.end_date = end_date
     
-    def run(self):
+    @property
+    def first_diff(self):
+        '''
+        First differences of the price series, computed locally on first access 
+        '''
+        
+        if self._first_diff is None:
+            # the first date has no previous price, like the bql diff() the empty row is dropped 
+            self._first_diff = self.price.diff().dropna(how='all')
+        return self._first_diff
+    
+    @property
+    def log_price(self):
+        '''
+        Natural logarithm of the price series, computed locally on first access 
         '''
-        Function to retrieve bql fields used by app
+        
+        if self._log_price is None:
+            self._log_price = np.log(self.price)
+        return self._log_price
+    
+    def fetch_prices(self, univ, start_date, end_date):
+        '''
+        Function to request the price series of a universe from bql 
+        
+        Parameters:
+        -----------
+        univ: bql universe 
+        start_date: start date for data retrieval 
+        end_date: end date for data retrieval 
         
         Returns
         -------
-        dictionary of bql fields 
+        dataframe of prices (date x ticker)
         '''
         
         fields = {
-            'price': self._bq.data.px_last(ca_adj='full',dates=self._bq.func.range(start = self.start_date, end = self.end_date, frq='D'), fill='PREV', currency='USD' ), 
-            'first_diff': self._bq.data.px_last(ca_adj='full',dates=self._bq.func.range(start = self.start_date,  end = self.end_date, frq='D'), fill='PREV',currency='USD').diff(),
-            'log_price': self._bq.data.px_last(ca_adj='full',dates=self._bq.func.range(start = self.start_date, end = self.end_date, frq='D'),fill='PREV',currency='USD').ln()
+            'price': self._bq.data.px_last(ca_adj='full',dates=self._bq.func.range(start = start_date, end = end_date, frq='D'), fill='PREV', currency='USD' ), 
         }
         
-        res = self._bq.execute(bql.Request(self.univ, fields))
-        self.price = res.get('price').df().reset_index().pivot_table(values='price', index='DATE', columns='ID')
-        self.first_diff = res.get('first_diff').df().reset_index().pivot_table(values='first_diff', index='DATE', columns='ID')
-        self.log_price = res.get('log_price').df().reset_index().pivot_table(values='log_price', index='DATE', columns='ID')
+        res = self._bq.execute(bql.Request(univ, fields))
+        return res.get('price').df().reset_index().pivot_table(values='price', index='DATE', columns='ID').astype(np.float64)
+    
+    def get_stored_prices(self):
+        '''
+        Function to get prices from the local store, only the dates and tickers it is missing are requested from bql 
+        
+        Bars dated today or later may be intraday prices and are never stored, so every stored bar is a close. 
+        Each fetch overlaps the stored history by one date: prices are ca_adj='full', a ticker whose overlapping 
+        price moved had a corporate action since it was stored and its whole history is requested again. 
+        
+        Returns
+        -------
+        dataframe of prices (date x ticker)
+        '''
+        
+        start_date, end_date = pd.Timestamp(self.start_date), pd.Timestamp(self.end_date)
+        today = pd.Timestamp.today().normalize()
+        stored = self.store.load(self.univ_key)
+        if stored is None:
+            price = self.fetch_prices(self.univ, start_date, end_date)
+            if (price.index < today).any():
+                self.store.save(self.univ_key, price[price.index < today], price.columns)
+            return price
+        
+        stored_price, stored_members = stored
+        price, members = stored_price, list(stored_members)
+        first_date, last_date = price.index[0], price.index[-1]
+        parts, rebased = [], set()
+        # only business days can be missing 
+        if len(pd.bdate_range(start_date, first_date - pd.Timedelta(days=1))):
+            new_price = self.fetch_prices(self.univ, start_date, first_date)
+            rebased.update(self.get_rebased_tickers(price, new_price, first_date))
+            parts.append(new_price)
+        if len(pd.bdate_range(last_date + pd.Timedelta(days=1), end_date)):
+            new_price = self.fetch_prices(self.univ, last_date, end_date)
+            rebased.update(self.get_rebased_tickers(price, new_price, last_date))
+            members = list(new_price.columns)
+            parts.append(new_price)
+            # history of tickers that joined the universe since the last fetch 
+            new_tickers = [ticker for ticker in members if ticker not in price.columns]
+            if new_tickers:
+                parts.append(self.fetch_prices(self._bq.univ.list(new_tickers), min(start_date, first_date), last_date))
+        
+        if not parts:
+            return self.select_prices(price, members, start_date, end_date)
+        
+        if rebased:
+            # stored history of these tickers is on the basis before the corporate action 
+            rebased = sorted(rebased)
+            price = price.drop(columns=rebased)
+            parts.append(self.fetch_prices(self._bq.univ.list(rebased), min(start_date, first_date), max(end_date, last_date)))
+        # fetched prices replace stored ones on overlapping dates 
+        price = pd.concat([price] + parts)
+        price = price.groupby(level=0).last().sort_index()
+        price.index.name = 'DATE'
+        
+        closed = price[price.index < today]
+        if rebased or members != list(stored_members) or closed.shape != stored_price.shape:
+            self.store.save(self.univ_key, closed, members)
+        return self.select_prices(price, members, start_date, end_date)
+    
+    @staticmethod
+    def get_rebased_tickers(stored_price, new_price, date):
+        '''
+        Function to find the tickers whose fetched price differs from the stored one on an overlapping date 
+        
+        Parameters:
+        -----------
+        stored_price: dataframe of stored prices (date x ticker)
+        new_price: dataframe of fetched prices (date x ticker)
+        date: date in both dataframes 
+        
+        Returns
+        -------
+        list of tickers 
+        '''
+        
+        if date not in stored_price.index or date not in new_price.index:
+            return []
+        tickers = [ticker for ticker in new_price.columns if ticker in stored_price.columns]
+        old, new = stored_price.loc[date, tickers].values, new_price.loc[date, tickers].values
+        moved = np.isfinite(old) & np.isfinite(new) & ~np.isclose(new, old, rtol=1e-6, atol=0.)
+        return [ticker for ticker, m in zip(tickers, moved) if m]
+    
+    @staticmethod
+    def select_prices(price, members, start_date, end_date):
+        '''
+        Function to select the members and dates of a run from the prices of the store 
+        '''
+        
+        members = [ticker for ticker in members if ticker in price.columns]
+        price = price.loc[start_date:end_date, members]
+        return price.dropna(how='all', axis=1).dropna(how='all')
+    
+    def run(self):
+        '''
+        Function to retrieve bql fields used by app
+        
+        The price series is requested once (or only the missing part of it when a PriceStore is set), 
+        first differences and log prices are derived locally. 
+        
+        Returns
+        -------
+        dictionary of bql fields 
+        '''
+        
+        if self.store is None:
+            self.price = self.fetch_prices(self.univ, self.start_date, self.end_date)
+        else:
+            self.price = self.get_stored_prices()
+        self._first_diff, self._log_price = None, None
         self.univ_tickers = list(self.price.columns.values)
         self.dates = list(self.price.index)
         
-        return {
-            'price': self.price,
-            'first_diff': self.first_diff,
-            'log_price': self.log_price,
-            'univ_tickers': self.univ_tickers,
-            'dates': self.dates
-        } 
+        return DataFields(self)
@@ -0,0 +1,205 @@
+import os
+import numpy as np
+import pandas as pd
+from BacktestMetrics import METRIC_COLUMNS
+
+class PairResults(object):
+    '''
+    PairResults class storing the screening and backtesting results of all pairs in contiguous arrays 
+    
+    Pairs are identified by an integer pair id, their position in the backtest: pair p has its 
+    tickers in independent[p]/ dependent[p], its metrics in metrics[col][p], its trades in 
+    slice offsets[p]:offsets[p + 1] of the trade arrays and its curves in column p of the 
+    zscores, spreads and capital matrices (days x pairs). 
+    '''
+    
+    def __init__(self):
+        self.key_pairs = []
+        self.pair_ids = {}
+    
+    def initialise_model(self, coint_model, bt_model, signal_engine=None):
+        '''
+        Function to initialise a PairResults object from the models of a run 
+        
+        Parameters:
+        -----------
+        coint_model: CointModel after screen_univ 
+        bt_model: BacktestingModel after run and compute_bt_metrics 
+        signal_engine: SignalEngine seeded from bt_model, its curves include the live bars, None to use the backtest curves 
+        '''
+        
+        self.key_pairs = list(bt_model.key_pairs)
+        self.pair_ids = {key_pair: p for p, key_pair in enumerate(self.key_pairs)}
+        self.independent = np.array([key_pair[0] for key_pair in self.key_pairs], dtype=object)
+        self.dependent = np.array([key_pair[1] for key_pair in self.key_pairs], dtype=object)
+        self.hedge_ratios = np.array([bt_model.coint_pairs[key_pair][0] for key_pair in self.key_pairs], dtype=np.float64)
+        self.half_lives = np.array([bt_model.coint_pairs[key_pair][1] for key_pair in self.key_pairs], dtype=np.float64)
+        self.adf_stats = pd.DataFrame([coint_model.residual_stats.get(key_pair) for key_pair in self.key_pairs],
+                                      columns=['1%', '5%', '10%', 'Test Stat'])
+        self.metrics = {col: bt_model.metrics[col].values for col in METRIC_COLUMNS}
+        self.init_cap = bt_model.init_cap
+        
+        # trades are sorted by pair in the kernel buffers
+        res = bt_model.kernel_results
+        self.offsets = res['offsets']
+        self.trade_pair = res['pair']
+        self.entry_idx, self.exit_idx = res['entry_idx'], res['exit_idx']
+        self.pnl, self.trade_capital = res['pnl'], res['capital']
+        
+        self.dates = np.asarray(pd.DatetimeIndex(bt_model.data.get('dates')))
+        self.trade_dates = self.dates
+        self.zscores = bt_model.zscore_matrix.T
+        self.spreads = res['spreads']
+        self.capital = res['daily_cap']
+        if signal_engine is not None:
+            self.set_curves(signal_engine)
+    
+    def set_curves(self, signal_engine):
+        '''
+        Function to point the curves and trades to the history of the signal engine, backtest followed by the live bars 
+        
+        Parameters:
+        -----------
+        signal_engine: SignalEngine seeded from the same backtest 
+        '''
+        
+        num_days = signal_engine.num_days
+        self.zscores = signal_engine._zscores[:num_days]
+        self.spreads = signal_engine._spreads[:num_days]
+        self.capital = signal_engine._capital[:num_days]
+        if len(self.dates) != num_days:
+            self.dates = np.asarray(pd.DatetimeIndex(signal_engine.dates))
+        self.trade_dates = self.dates
+        
+        # trades closed on live bars are appended after the seed trades, a stable sort by pair keeps them in date order 
+        pair, entry_idx, exit_idx, pnl, capital = (np.concatenate(col) for col in zip(*signal_engine.trades))
+        order = np.argsort(pair, kind='stable')
+        self.trade_pair, self.entry_idx, self.exit_idx = pair[order], entry_idx[order], exit_idx[order]
+        self.pnl, self.trade_capital = pnl[order], capital[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(self.trade_pair, minlength=len(self.key_pairs)))])
+    
+    def __len__(self):
+        return len(self.key_pairs)
+    
+    def pair_id(self, key_pair):
+        '''
+        Function to get the integer id of a pair 
+        
+        Parameters:
+        -----------
+        key_pair: tuple of (independent ticker, dependent ticker) 
+        
+        Returns
+        -------
+        pair id 
+        '''
+        
+        return self.pair_ids[key_pair]
+    
+    def options(self):
+        '''
+        Function to get the (label, pair id) options of a dropdown, sorted by label 
+        '''
+        
+        labels = ['{} / {}'.format(indep, dep) for indep, dep in zip(self.independent, self.dependent)]
+        return sorted(zip(labels, range(len(labels))))
+    
+    def table(self):
+        '''
+        Function to get the results table, one row per pair id 
+        
+        Returns
+        -------
+        dataframe of tickers, hedge ratio and backtesting metrics 
+        '''
+        
+        table = pd.DataFrame({'Independent': self.independent, 'Dependent': self.dependent, 'Ratio': self.hedge_ratios})
+        for col in METRIC_COLUMNS:
+            table[col] = self.metrics[col]
+        table.index.name = 'Pair ID'
+        return table
+    
+    def trades(self, p):
+        '''
+        Function to get the closed trades of a pair 
+        
+        Parameters:
+        -----------
+        p: pair id 
+        
+        Returns
+        -------
+        arrays of entry dates, exit dates, pnl and capital after each trade 
+        '''
+        
+        start, end = self.offsets[p], self.offsets[p + 1]
+        return (self.trade_dates[self.entry_idx[start:end]], self.trade_dates[self.exit_idx[start:end]],
+                self.pnl[start:end], self.trade_capital[start:end])
+    
+    def capital_curve(self, p):
+        '''
+        Function to get the capital of a pair after each closed trade, starting from the initial capital 
+        
+        Parameters:
+        -----------
+        p: pair id 
+        
+        Returns
+        -------
+        arrays of dates and capital 
+        '''
+        
+        _, exit_dates, _, capital = self.trades(p)
+        return np.concatenate([self.trade_dates[:1], exit_dates]), np.concatenate([[self.init_cap], capital])
+    
+    def to_frames(self):
+        '''
+        Function to arrange the store in flat dataframes 
+        
+        Returns
+        -------
+        dictionary of the pairs, trades and daily curves dataframes, keyed by pair id 
+        '''
+        
+        pairs = self.table().reset_index()
+        pairs['Half Life'] = self.half_lives
+        for col in self.adf_stats.columns:
+            pairs['ADF ' + col] = self.adf_stats[col].values
+        
+        trades = pd.DataFrame({
+            'Pair ID': self.trade_pair,
+            'Entry Date': self.trade_dates[self.entry_idx],
+            'Exit Date': self.trade_dates[self.exit_idx],
+            'PnL': self.pnl,
+            'Capital': self.trade_capital
+        })
+        
+        num_days, num_pairs = self.zscores.shape
+        curves = pd.DataFrame({
+            'Pair ID': np.tile(np.arange(num_pairs), num_days),
+            'Date': np.repeat(self.dates, num_pairs),
+            'Z Score': self.zscores.ravel(),
+            'Spread': self.spreads.ravel(),
+            'Capital': self.capital.ravel()
+        })
+        return {'pairs': pairs, 'trades': trades, 'curves': curves}
+    
+    def to_parquet(self, path):
+        '''
+        Function to export the store to Parquet, one file per dataframe of to_frames (needs pyarrow or fastparquet) 
+        
+        Parameters:
+        -----------
+        path: folder of the Parquet files 
+        
+        Returns
+        -------
+        list of written file paths 
+        '''
+        
+        os.makedirs(path, exist_ok=True)
+        files = []
+        for name, frame in self.to_frames().items():
+            files.append(os.path.join(path, '{}.parquet'.format(name)))
+            frame.to_parquet(files[-1], index=False)
+        return files
@@ -0,0 +1,98 @@
+import os, json, hashlib
+import numpy as np
+import pandas as pd
+
+class PriceStore(object):
+    '''
+    PriceStore class for a local, memory-mapped store of daily prices per universe 
+    
+    Each universe is kept in its own folder as a float64 date x ticker matrix (prices.npy), 
+    its dates (dates.npy), its tickers and the tickers of the latest universe fetch (meta.json). 
+    meta.json also records the number of dates and tickers of the save, files left by an 
+    interrupted save do not match it and are ignored. 
+    Prices are ca_adj='full', so a corporate action makes the stored history stale: clear the 
+    universe to rebuild it. 
+    '''
+    
+    def __init__(self, root_dir='price_store'):
+        self.root_dir = root_dir
+    
+    def get_path(self, key):
+        '''
+        Function to get the folder of a universe 
+        
+        Parameters:
+        -----------
+        key: string identifying the universe 
+        
+        Returns
+        -------
+        folder path 
+        '''
+        
+        slug = ''.join(c if c.isalnum() else '_' for c in key)[:40]
+        return os.path.join(self.root_dir, '{}_{}'.format(slug, hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]))
+    
+    def load(self, key):
+        '''
+        Function to load the stored prices of a universe, the matrix is memory-mapped rather than read 
+        
+        Parameters:
+        -----------
+        key: string identifying the universe 
+        
+        Returns
+        -------
+        dataframe of prices (date x ticker) and list of members of the latest fetch, None if nothing 
+        (consistent) is stored 
+        '''
+        
+        path = self.get_path(key)
+        if not all(os.path.exists(os.path.join(path, name)) for name in ('prices.npy', 'dates.npy', 'meta.json')):
+            return None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        prices = np.load(os.path.join(path, 'prices.npy'), mmap_mode='r')
+        dates = pd.DatetimeIndex(np.load(os.path.join(path, 'dates.npy')), name='DATE')
+        # files of different saves (interrupted save) 
+        shape = (meta.get('num_dates'), meta.get('num_tickers'))
+        if prices.shape != shape or len(dates) != shape[0] or len(meta['tickers']) != shape[1]:
+            return None
+        price = pd.DataFrame(prices, index=dates, columns=pd.Index(meta['tickers'], name='ID'), copy=False)
+        return price, meta['members']
+    
+    def save(self, key, price, members):
+        '''
+        Function to write the prices of a universe, each file is replaced atomically but not the 
+        three of them together: load rejects files whose sizes do not match meta.json 
+        
+        Parameters:
+        -----------
+        key: string identifying the universe 
+        price: dataframe of prices (date x ticker)
+        members: list of tickers returned by the latest universe fetch 
+        '''
+        
+        path = self.get_path(key)
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'prices.tmp.npy'), np.ascontiguousarray(price.values, dtype=np.float64))
+        np.save(os.path.join(path, 'dates.tmp.npy'), price.index.values.astype('datetime64[ns]'))
+        with open(os.path.join(path, 'meta.tmp.json'), 'w') as f:
+            json.dump({'key': key, 'tickers': list(price.columns), 'members': list(members),
+                       'num_dates': price.shape[0], 'num_tickers': price.shape[1]}, f)
+        for name in ('prices.npy', 'dates.npy', 'meta.json'):
+            os.replace(os.path.join(path, name.replace('.', '.tmp.', 1)), os.path.join(path, name))
+    
+    def clear(self, key):
+        '''
+        Function to delete the stored prices of a universe 
+        
+        Parameters:
+        -----------
+        key: string identifying the universe 
+        '''
+        
+        path = self.get_path(key)
+        for name in ('prices.npy', 'dates.npy', 'meta.json'):
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
@@ -0,0 +1,286 @@
+import math
+import numpy as np
+import pandas as pd
+from BacktestingModel import LazyZScores, leg_spreads, spread_kernel
+
+class SignalEngine(object):
+    '''
+    SignalEngine class for live, incremental updates of the residual z-scores, trading signals and capital 
+    
+    The engine is seeded from a backtest and then takes one price bar per ticker at a time. Each pair 
+    (or basket) keeps a ring buffer of its last lookback residuals with their running sum and sum of 
+    squares, so a new bar updates every z-score, position and capital in O(pairs). 
+    '''
+    
+    def __init__(self, resync_every=250):
+        self.resync_every = resync_every
+        self.key_pairs = []
+    
+    def initialise_model(self, bt_model, exit_band=None):
+        '''
+        Function to initialise a SignalEngine object from a BacktestingModel 
+        
+        The z-score and spread history are taken from the backtest, and the position state comes 
+        from replaying the backtest without closing the positions still open on the last day. 
+        Live bars are charged the costs of the backtest cost model. 
+        
+        Parameters:
+        -----------
+        bt_model: initialised BacktestingModel (after get_zscores) 
+        exit_band: absolute z-score under which positions are closed, defaults to the one of the backtest 
+        '''
+        
+        price = bt_model.data.get('price')
+        log_price = bt_model.data.get('log_price')
+        self.tickers = list(price.columns)
+        self.key_pairs = list(bt_model.key_pairs)
+        self.std = bt_model.std
+        self.init_cap = bt_model.init_cap
+        self.exit_band = bt_model.exit_band if exit_band is None else exit_band
+        self.cost_model = bt_model.cost_model
+        self.leg_idx, self.weights = bt_model.get_legs(self.tickers)
+        self.windows = np.array([math.ceil(coint_res[1]) for coint_res in bt_model.coint_pairs.values()], dtype=np.int64)
+        num_pairs = len(self.key_pairs)
+        
+        # history buffers grow by doubling, rows past self.num_days are unused
+        prices = price.values.astype(np.float64)
+        num_days = len(prices)
+        self.num_days = num_days
+        self.dates = list(bt_model.data.get('dates'))
+        self._zscores = np.empty((2 * num_days + 1, num_pairs))
+        self._spreads = np.empty((2 * num_days + 1, num_pairs))
+        self._capital = np.empty((2 * num_days + 1, num_pairs))
+        self._zscores[:num_days] = bt_model.zscore_matrix.T
+        self._spreads[:num_days] = leg_spreads(prices, self.leg_idx, self.weights)
+        
+        costs = self.cost_model.bind(price, self.leg_idx, self.weights) if self.cost_model is not None else None
+        res = spread_kernel(self._spreads[:num_days], self._zscores[:num_days], self.std, self.init_cap, self.exit_band, 
+                            close_last=False, costs=costs)
+        self._capital[:num_days] = res['daily_cap']
+        self.state = {k: v.copy() for k, v in res['state'].items()}
+        self.trades = [(res['pair'], res['entry_idx'], res['exit_idx'], res['pnl'], res['capital'])]
+        self.last_price = prices[-1].copy()
+        self.last_log_price = log_price.values[-1].astype(np.float64)
+        
+        # offset between the screening residual (centered) and the weighted sum of log prices
+        residuals = np.vstack([np.asarray(coint_res[2], dtype=np.float64) for coint_res in bt_model.coint_pairs.values()]) if num_pairs else np.zeros((0, num_days))
+        self.offsets = residuals[:, -1] - self.raw_residuals(self.last_log_price) if num_pairs else np.zeros(0)
+        self.seed_windows(residuals)
+    
+    def raw_residuals(self, log_prices):
+        '''
+        Function to compute the weighted sum of the leg log prices of every pair for one bar 
+        '''
+        
+        return (log_prices[self.leg_idx] * self.weights).sum(axis=1)
+    
+    def seed_windows(self, residuals):
+        '''
+        Function to fill the ring buffers with the last lookback residuals of each pair 
+        
+        The residual of day t sits in slot t % lookback, pairs whose window is not valid 
+        (lookback < 2) never produce a z-score. 
+        
+        Parameters:
+        -----------
+        residuals: array of residual series, one row per pair (num pairs x num days) 
+        '''
+        
+        num_pairs, num_days = residuals.shape
+        self.valid = self.windows >= 2
+        windows = np.where(self.valid, self.windows, 1)
+        self.buffer = np.zeros((num_pairs, windows.max(initial=1)))
+        self.count = np.minimum(windows, num_days)
+        self.slot = np.full(num_pairs, num_days, dtype=np.int64) % windows
+        self.ticks = 0
+        
+        for window in np.unique(windows):
+            idx = np.flatnonzero(windows == window)
+            days = np.arange(max(num_days - window, 0), num_days)
+            self.buffer[np.ix_(idx, days % window)] = residuals[np.ix_(idx, days)]
+        self.resync()
+    
+    def resync(self):
+        '''
+        Function to recompute the running sums from the ring buffers, bounding the drift of the incremental updates 
+        '''
+        
+        self.win_sum = self.buffer.sum(axis=1)
+        self.win_sum_sq = (self.buffer * self.buffer).sum(axis=1)
+    
+    def update(self, bar_date, prices):
+        '''
+        Function to process one new price bar 
+        
+        Parameters:
+        -----------
+        bar_date: date of the bar 
+        prices: series/ dictionary of traded price per ticker, missing tickers keep their last price 
+        
+        Returns
+        -------
+        dataframe of z-score, spread, position, signal and capital per pair 
+        '''
+        
+        prices = pd.Series(prices, dtype=np.float64).reindex(self.tickers).values
+        new_bar = ~np.isnan(prices)
+        self.last_price[new_bar] = prices[new_bar]
+        self.last_log_price[new_bar] = np.log(prices[new_bar])
+        num_pairs = len(self.key_pairs)
+        rows = np.arange(num_pairs)
+        
+        # running window update: the new residual replaces the oldest one
+        residual = self.raw_residuals(self.last_log_price) + self.offsets
+        windows = np.where(self.valid, self.windows, 1)
+        ok = ~np.isnan(residual)
+        old = self.buffer[rows, self.slot]
+        self.win_sum[ok] += residual[ok] - old[ok]
+        self.win_sum_sq[ok] += residual[ok] * residual[ok] - old[ok] * old[ok]
+        self.buffer[rows[ok], self.slot[ok]] = residual[ok]
+        self.slot[ok] = (self.slot[ok] + 1) % windows[ok]
+        self.count[ok] = np.minimum(self.count[ok] + 1, windows[ok])
+        self.ticks += 1
+        if self.resync_every and self.ticks % self.resync_every == 0:
+            self.resync()
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            win_avg = self.win_sum / windows
+            win_std = np.sqrt(np.maximum(self.win_sum_sq - self.win_sum * win_avg, 0) / (windows - 1))
+            zscore = (residual - win_avg) / win_std
+        zscore[~(self.valid & ok & (self.count == windows))] = np.nan
+        spread = leg_spreads(self.last_price[None, :], self.leg_idx, self.weights)[0]
+        
+        costs = None
+        if self.cost_model is not None:
+            # costs of the bar are computed on its last prices, as day 0 of a one day binding 
+            costs = self.cost_model.bind(pd.DataFrame([self.last_price], index=[bar_date], columns=self.tickers), self.leg_idx, self.weights)
+        signal = self.step(zscore, spread, costs)
+        self.append(bar_date, zscore, spread)
+        
+        return pd.DataFrame({
+            'Z Score': zscore,
+            'Spread': spread,
+            'Position': self.state['pos'],
+            'Signal': signal,
+            'Capital': self.state['cap']
+        }, index=pd.MultiIndex.from_tuples(self.key_pairs) if self.key_pairs else None)
+    
+    def step(self, zscore, spread, costs=None):
+        '''
+        Function to apply the trading rules of the backtest to one bar 
+        
+        Parameters:
+        -----------
+        zscore: array of z-scores of the bar 
+        spread: array of spreads of the bar 
+        costs: costs bound to the legs of the spreads for the bar (day 0), None for frictionless fills 
+        
+        Returns
+        -------
+        array of signals ('Enter Long', 'Enter Short', 'Exit' or '') 
+        '''
+        
+        state, i = self.state, self.num_days
+        pos, cap, active, cost_paid = state['pos'], state['cap'], state['active'], state['cost_paid']
+        
+        # Stop trading if capital becomes negative
+        active &= ~(cap <= 0)
+        flat = active & (pos == 0)
+        open_long = flat & (zscore < -self.std)
+        open_short = flat & ~open_long & (zscore > self.std)
+        close = active & (pos != 0) & ((np.abs(zscore) < self.exit_band) | ((pos == 1) & (zscore > 0)) | ((pos == -1) & (zscore < 0)))
+        
+        idx = np.flatnonzero(close)
+        if idx.size:
+            pnl = np.where(pos[idx] == 1, (spread[idx] - state['start_spread'][idx]) * state['start_num_spread'][idx],
+                           (state['start_spread'][idx] - spread[idx]) * state['start_num_spread'][idx])
+            if costs is not None:
+                pnl = pnl - cost_paid[idx] - costs.execution(0, idx, state['start_num_spread'][idx])
+                cost_paid[idx] = 0
+            cap[idx] = cap[idx] + pnl
+            self.trades.append((idx, state['start_idx'][idx], np.full(idx.size, i), pnl, cap[idx]))
+            pos[idx] = 0
+        
+        idx = np.flatnonzero(open_long | open_short)
+        if idx.size:
+            state['start_spread'][idx] = spread[idx]
+            pos[idx] = np.where(open_long[idx], 1, -1)
+            state['start_num_spread'][idx] = cap[idx]/ np.abs(spread[idx])
+            state['start_idx'][idx] = i
+            if costs is not None:
+                cost_paid[idx] = costs.execution(0, idx, state['start_num_spread'][idx])
+        
+        if costs is not None:
+            # borrow on the short legs of the positions held overnight 
+            idx = np.flatnonzero(active & (pos != 0))
+            if idx.size:
+                cost_paid[idx] += costs.holding(0, idx, pos[idx], state['start_num_spread'][idx])
+        
+        signal = np.full(len(pos), '', dtype=object)
+        signal[close] = 'Exit'
+        signal[open_long] = 'Enter Long'
+        signal[open_short] = 'Enter Short'
+        return signal
+    
+    def append(self, bar_date, zscore, spread):
+        '''
+        Function to append a bar to the history buffers, doubling their capacity when full 
+        '''
+        
+        if self.num_days == len(self._zscores):
+            self._zscores, self._spreads, self._capital = (np.concatenate([hist, np.empty_like(hist)])
+                                                           for hist in (self._zscores, self._spreads, self._capital))
+        self._zscores[self.num_days] = zscore
+        self._spreads[self.num_days] = spread
+        self._capital[self.num_days] = self.state['cap']
+        self.dates.append(bar_date)
+        self.num_days += 1
+    
+    @property
+    def zscores(self):
+        '''
+        Dictionary of z-score series per pair, backtest history followed by the live bars 
+        '''
+        
+        return LazyZScores(self.key_pairs, self._zscores[:self.num_days].T)
+    
+    @property
+    def all_spreads(self):
+        '''
+        Dictionary of spread series per pair, backtest history followed by the live bars 
+        '''
+        
+        return LazyZScores(self.key_pairs, self._spreads[:self.num_days].T)
+    
+    @property
+    def capital(self):
+        '''
+        Dataframe of daily capital, one column per pair 
+        '''
+        
+        return pd.DataFrame(self._capital[:self.num_days], index=self.dates, columns=pd.MultiIndex.from_tuples(self.key_pairs) if self.key_pairs else None)
+    
+    def get_trade_info(self):
+        '''
+        Function to get the closed trades in the format of BacktestingModel.run 
+        
+        Returns
+        -------
+        dictionary of trade dates, pnl and capital per pair 
+        '''
+        
+        pair, entry_idx, exit_idx, pnl, capital = (np.concatenate(col) for col in zip(*self.trades))
+        order = np.argsort(pair, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(pair, minlength=len(self.key_pairs)))])
+        trade_dates, pnl_vals, cap_vals = {}, {}, {}
+        for p, key_pair in enumerate(self.key_pairs):
+            k = order[offsets[p]:offsets[p + 1]]
+            trade_dates[key_pair] = [(self.dates[i], self.dates[j]) for i, j in zip(entry_idx[k], exit_idx[k])]
+            pnl_vals[key_pair] = pnl[k].tolist()
+            cap_vals[key_pair] = [self.init_cap, ] + capital[k].tolist()
+        
+        return {
+            'trade_dates': trade_dates,
+            'pnl_vals': pnl_vals,
+            'cap_vals': cap_vals
+        }
@@ -3,12 +3,18 @@ import numpy as np
 import pandas as pd
 from datetime import date, timedelta
 import traceback
-from ast import literal_eval as make_tuple
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # importing DataModel, Backtestingodel, Cointmodel and UniversePicker class
 from DataModel import DataModel
+from PriceStore import PriceStore
 from BacktestingModel import BacktestingModel
-from CointModel import CointModel
+from CostModel import CostModel
+from CointModel import CointModel, ScreeningCancelled
+from SignalEngine import SignalEngine
+from PairResults import PairResults
 from universe import * 
 
 # importing ibraries for app visuals 
@@ -37,7 +43,13 @@ _RENDERERS_cointpairs = {
     'Num Trades': TextRenderer(horizontal_alignment='center'),
     'Max Win': TextRenderer(format='.2f', horizontal_alignment='center'), 
     'Max Loss': TextRenderer(format='.2f', horizontal_alignment='center'),
+    'Sharpe': TextRenderer(format='.2f', horizontal_alignment='center'),
+    'Max Drawdown': TextRenderer(format='.2%', horizontal_alignment='center'),
+    'Avg Holding': TextRenderer(format='.1f', horizontal_alignment='center'),
+    'Half Life': TextRenderer(format='.1f', horizontal_alignment='center'),
 }
+_RESULT_COLUMNS = ['Independent', 'Dependent', 'Ratio', 'PnL Pcts', 'Win Pcts', 'Num Trades', 'Max Win', 
+                   'Max Loss', 'Sharpe', 'Max Drawdown', 'Avg Holding']
 _RENDERERS_teststats = {
     '1%': TextRenderer(format='.2f', horizontal_alignment='center'),
     '5%': TextRenderer(format='.2f', horizontal_alignment='center'),
@@ -50,6 +62,11 @@ errors = []
 _loading = '<i class="fa fa-spinner fa-spin fa-2x fa-fw" style="color:ivory;"></i>'
 status = HTML()
 
+# background executor running the pipeline, one run at a time, and cancel flag checked by the screening 
+executor = ThreadPoolExecutor(max_workers=1)
+cancel_event = threading.Event()
+pipeline = None
+
 # Text for instructions 
 instructions = '''
 <div style="color:ivory;background-color:DimGray;padding:10px;border-radius: 25px;">
@@ -69,9 +86,11 @@ instructions = '''
 </div>'''
 
 # Functionality: DateModel, CointModel, BacktestingModel and UniversePicker class 
-data_model = DataModel()
+data_model = DataModel(store=PriceStore())
 coint_model = CointModel()
 bt_model = BacktestingModel()
+signal_engine = SignalEngine()
+pair_results = PairResults()
 universe_picker = UniversePicker()
 
 # UI component: universe 
@@ -86,8 +105,13 @@ init_cap = Text(value='10000', layout=_LAY_MED)
 sig_lvl_comp = Dropdown(options=['1%', '5%', '10%','100%'], value='5%', layout=_LAY_MED)
 std_comp = Dropdown(options=['1', '1.5', '2'], value='1.5', layout=_LAY_MED)
 
+# UI component: trading costs, commission in bps of each leg and annual borrow rate (%) of the short legs 
+leg_bps_comp = Text(value='5', layout=_LAY_MED)
+borrow_comp = Text(value='0.5', layout=_LAY_MED)
+
 # UI component: run button 
 run_button = Button(description='Run', button_style='info')
+cancel_button = Button(description='Cancel', button_style='danger', disabled=True)
 
 # UI components: universe,dates and conditions components 
 univ_box = VBox([univ_comp])
@@ -97,6 +121,10 @@ conds_box = VBox([
         VBox([HTML('<h5>Initial Capital</h5>'), init_cap]),
         VBox([HTML('<h5>Confidence Level</h5>'),  sig_lvl_comp]),
         VBox([HTML('<h5>Trading Signals</h5>'), std_comp]),
+        ]),
+    HBox([
+        VBox([HTML('<h5>Cost per Leg (bps)</h5>'), leg_bps_comp]),
+        VBox([HTML('<h5>Borrow Rate (%)</h5>'), borrow_comp]),
         ])  
 ])
 dates_box = VBox([
@@ -109,34 +137,46 @@ results_grid = VBox()
 results_chart = VBox()
 
 data, coint_pairs, trade_info, bt_metrics = None, None, None, None
+pair_select = None
+found_pairs, partial_grid, last_render = {}, None, 0.
 
 # Charting method to update chart 
 def charts_update(event):
     refresh_charts(event['new'])
     
-# Charting method to create residual z-score chart  
-def zscore_chart(key_pair_tup):
-    zscores = bt_model.zscores.get(key_pair_tup)
-    dates = data_model.dates
-    pos_std = [bt_model.std, ] * len(dates)
-    neg_std = [-bt_model.std, ] * len(dates)
-    zero_mean = [0, ] * len(dates)
+# maximum number of points drawn per series, longer series are downsampled for display 
+_MAX_POINTS = 1000
+
+# Charting method to downsample a series for display, keeping the min and max of each bucket of days 
+def downsample(dates, values, max_points=_MAX_POINTS):
+    values = np.asarray(values, dtype=np.float64)
+    dates = np.asarray(dates)
+    num_days = len(values)
+    if num_days <= max_points:
+        return dates, values
     
-    # dataframe 
-    dataframe = pd.DataFrame(np.column_stack([zscores, pos_std, neg_std, zero_mean]),
-                index=dates,
-                columns=['Z Scores', '+ STD', '- STD', 'Long Term Mean'])
+    # two points per bucket, so spikes of the z-score stay visible 
+    bucket = -(-num_days // (max_points // 2))
+    num_buckets = -(-num_days // bucket)
+    blocks = np.full(num_buckets * bucket, np.nan)
+    blocks[:num_days] = values
+    blocks = blocks.reshape(num_buckets, bucket)
+    offsets = np.arange(num_buckets) * bucket
+    low = np.where(np.isnan(blocks), np.inf, blocks).argmin(axis=1) + offsets
+    high = np.where(np.isnan(blocks), -np.inf, blocks).argmax(axis=1) + offsets
+    idx = np.unique(np.concatenate([[0, num_days - 1], np.minimum(low, num_days - 1), np.minimum(high, num_days - 1)]))
+    return dates[idx], values[idx]
 
+# Charting method to create an empty line chart, marks are filled by refresh_charts 
+def line_chart(marks_style, legend_style=None):
+    
+    legend_style = {'stroke': 'none'} if legend_style is None else legend_style
+    
     # Create scales
     scale_x, scale_y = bqp.DateScale(), bqp.LinearScale()
     
-    # Create the Lines mark
-    mark_line = bqp.Lines(x=dataframe.index,
-                     y=[dataframe[col] for col in dataframe.columns],
-                          scales={'x': scale_x, 'y': scale_y},
-                          colors=['#1B84ED', '#CF7DFF', '#FF5A00', '#00D3D6'],
-                          labels=dataframe.columns.tolist(),
-                          display_legend=True)
+    # Create the Lines marks
+    marks = [bqp.Lines(x=[], y=[], scales={'x': scale_x, 'y': scale_y}, **style) for style in marks_style]
     
     # Create Axes
     axis_x = bqp.Axis(scale=scale_x, label='Dates', label_color='ivory')
@@ -146,19 +186,26 @@ def zscore_chart(key_pair_tup):
                   label_offset='4em')
     
     # Create Figure
-    figure = bqp.Figure(marks=[mark_line],
+    figure = bqp.Figure(marks=marks,
                     axes=[axis_x, axis_y],
                     layout={'width':'800px', 'height': '400px'},
                     title_style={'font-size': '16px'},
                     legend_location='top-left',
                     interaction=IndexSelector(scale=scale_x,
-                                               marks=[mark_line]),
-                    legend_style={'stroke': 'none', 'font-size': '10px'},
-                        fig_margin={'top': 10, 'bottom': 30,
+                                              marks=marks[:1]),
+                    legend_style=legend_style,
+                    fig_margin={'top': 10, 'bottom': 30,
                                 'left': 10, 'right': 80})
     
     return figure
 
+# Charting method to create residual z-score chart, the thresholds are horizontal lines of two points 
+def zscore_chart():
+    return line_chart([
+        {'colors': ['#1B84ED'], 'labels': ['Z Scores'], 'display_legend': True},
+        {'colors': ['#CF7DFF', '#FF5A00', '#00D3D6'], 'labels': ['+ STD', '- STD', 'Long Term Mean'], 'display_legend': True}
+    ], legend_style={'stroke': 'none', 'font-size': '10px'})
+
 # Chart text to expain the residual z-score chart
 graph_txt = '''
     <p style="color:grey;"><i>For any pair of cointegrated tickers, we compute a rolling z-score based on the 
@@ -172,193 +219,207 @@ graph_txt = '''
     <i></p>'''
 
 # Charting method to create spread chart 
-def spread_chart(key_pair_tup):
-    all_spread = bt_model.all_spreads.get(key_pair_tup)
-    dates = data_model.dates
-    
-    dataframe = pd.DataFrame(all_spread,
-                index=dates,
-                columns=['Spreads'])
-    
-    # Create scales
-    scale_x = bqp.DateScale()
-    scale_y = bqp.LinearScale()
-    
-    # Create the Lines mark
-    mark_line = bqp.Lines(x=dataframe.index,
-                      y=[dataframe[col] for col in dataframe.columns],
-                      scales={'x': scale_x, 'y': scale_y},
-                      colors=['#1B84ED'],
-                      labels=dataframe.columns.tolist(),
-                      display_legend=True)
-    # Create Axes
-    axis_x = bqp.Axis(scale=scale_x, label='Dates', label_color='ivory')
-    axis_y = bqp.Axis(scale=scale_y,
-                  orientation='vertical',
-                  side='right',
-                  label_offset='4em')
-    # Create Figure
-    figure = bqp.Figure(marks=[mark_line],
-                    axes=[axis_x, axis_y],
-                    layout={'width':'800px', 'height': '400px'},
-                    title_style={'font-size': '16px'},
-                    legend_location='top-left',
-                    interaction=IndexSelector(scale=scale_x,
-                                              marks=[mark_line]),
-                    legend_style={'stroke': 'none'},
-                    fig_margin={'top': 10, 'bottom': 30,
-                                'left': 10, 'right': 80})
-    
-    return figure
+def spread_chart():
+    return line_chart([{'colors': ['#1B84ED'], 'labels': ['Spreads'], 'display_legend': True}])
 
 # Charting method to create capital chart 
-def capital_chart(key_pair_tup, trade_info):
-    capital_data = trade_info.get('cap_vals').get(key_pair_tup)
-    dates = trade_info.get('trade_dates').get(key_pair_tup)
-    dates = [x[1] for x in dates]
-    dates.insert(0,data.get('dates')[0])
+def capital_chart():
+    return line_chart([{'colors': ['#1B84ED'], 'labels': ['Capital'], 'y_legend': True}])
+
+# UI component: charts, created once and updated in place when another pair is selected 
+zscore_fig, spread_fig, capital_fig = zscore_chart(), spread_chart(), capital_chart()
+adf_grid = None
+charts_box = VBox(layout=box_layout)
+
+# Charting method to swap the data of a line mark 
+def set_mark_data(mark, x, y):
+    with mark.hold_sync():
+        mark.x = x
+        mark.y = y
+
+# Charting method to refresh charts dynamically based on the pair id selected in pair_select 
+def refresh_charts(pair_id):
     
-    dataframe = pd.DataFrame(capital_data,
-                index=dates,
-                columns=['Capital'])
+    global adf_grid
     
-    # Create scales
-    scale_x = bqp.DateScale()
-    scale_y = bqp.LinearScale()
+    # engle-granger stats of the pair 
+    adf_table = pair_results.adf_stats.iloc[[pair_id]].reset_index(drop=True)
+    if adf_grid is None:
+        adf_grid = DataGrid(
+            adf_table,
+            base_row_size=20,base_column_size=80,base_column_header_size=20, base_row_header_size=60, 
+            header_visibility='column', renderers=_RENDERERS_teststats, 
+            layout={'height': '50px', 'width': '320px'}    
+        )
+    else:
+        adf_grid.data = adf_table
     
+    # z-score and spread of the backtest followed by the live bars 
+    dates = pair_results.dates
+    set_mark_data(zscore_fig.marks[0], *downsample(dates, pair_results.zscores[:, pair_id]))
+    set_mark_data(zscore_fig.marks[1], dates[[0, -1]], 
+                  [[signal_engine.std, signal_engine.std], [-signal_engine.std, -signal_engine.std], [0, 0]])
+    set_mark_data(spread_fig.marks[0], *downsample(dates, pair_results.spreads[:, pair_id]))
     
-    # Create the Lines mark
-    mark_line = bqp.Lines(x=dataframe.index,
-                      y=[dataframe[col] for col in dataframe.columns],
-                      scales={'x': scale_x, 'y': scale_y},
-                      colors=['#1B84ED'],
-                      labels=dataframe.columns.tolist(),
-                      y_legend=True)
-    # Create Axes
-    axis_x = bqp.Axis(scale=scale_x, label='Dates', label_color='ivory')
-    axis_y = bqp.Axis(scale=scale_y,
-                  orientation='vertical',
-                  side='right',
-                  label_offset='4em')
-    # Create Figure
-    figure = bqp.Figure(marks=[mark_line],
-                    axes=[axis_x, axis_y],
-                    # title='Capital',
-                    layout={'width':'800px', 'height': '400px'},
-                    title_style={'font-size': '16px'},
-                    legend_location='top-left',
-                    interaction=IndexSelector(scale=scale_x,
-                                              marks=[mark_line]),
-                    legend_style={'stroke': 'none'},
-                    fig_margin={'top': 10, 'bottom': 30,
-                                'left': 10, 'right': 80})
+    # capital after each closed trade 
+    set_mark_data(capital_fig.marks[0], *pair_results.capital_curve(pair_id))
     
-    return figure
+    # charts and test stat table are only laid out once 
+    if not charts_box.children:
+        charts_box.children = [
+            HTML('<h1>                  </h1>'),
+            HTML("<h5><font color='ivory'>Residual Z-Score Chart</h5>"),
+            zscore_fig,
+            HTML(graph_txt),
+            HTML("<h5><font color='ivory'>Spread Chart</h5>"),
+            spread_fig,
+            HTML("<h5><font color='ivory'>Engle-Granger Co-integration Test</h5>"),
+            adf_grid,
+            HTML("<h1>                     </h1>"),
+            HTML("<h5><font color='ivory'>Capital Chart</h5>"),
+            capital_fig
+        ]
+    results_chart.children = [charts_box]
 
-# Charting method to refresh charts dynamically based on tickers pair selected in pair_select 
-def refresh_charts(key_pair_tup):
-    # transform string to a tuple 
-    key_pair_tup = make_tuple(key_pair_tup)
-    # retrieve and apply data transformation to engle-granger stats from coint_model 
-    adf_table = {k:[v] for k,v in coint_model.residual_stats.get(key_pair_tup).items()}
-    adf_test_results = DataGrid(
-        pd.DataFrame.from_dict(adf_table),
-        base_row_size=20,base_column_size=80,base_column_header_size=20, base_row_header_size=60, 
-        header_visibility='column', renderers=_RENDERERS_teststats, 
-        layout={'height': '50px', 'width': '320px'}    
-    )
+# Method to show the current stage of the pipeline next to the Run button 
+def set_status(message, loading=True):
+    status.value = (_loading if loading else '') + ' <span style="color:ivory;">{}</span>'.format(message)
+
+# Method to stop the pipeline between stages once the Cancel button is hit 
+def check_cancel(stage):
+    if cancel_event.is_set():
+        raise ScreeningCancelled('Cancelled after {}'.format(stage))
+
+# Method to stream the cointegrated pairs into the results table while the screening runs 
+def screen_progress(num_tested, num_pairs, new_pairs):
     
-    # refresh all the charts and test stat table 
-    charts = VBox([
-        HTML('<h1>                  </h1>'),
-        HTML("<h5><font color='ivory'>Residual Z-Score Chart</h5>"),
-        zscore_chart(key_pair_tup),
-        HTML(graph_txt),
-        HTML("<h5><font color='ivory'>Spread Chart</h5>"),
-        spread_chart(key_pair_tup),
-        HTML("<h5><font color='ivory'>Engle-Granger Co-integration Test</h5>"),
-        adf_test_results,
-        HTML("<h1>                     </h1>"),
-        HTML("<h5><font color='ivory'>Capital Chart</h5>"),
-        capital_chart(key_pair_tup, trade_info)
-    ], layout=box_layout)
+    global partial_grid, last_render
     
-    results_chart.children = [charts]
+    found_pairs.update(new_pairs)
+    set_status('Tested {:,}/{:,} pairs, {:,} cointegrated'.format(num_tested, num_pairs, len(found_pairs)))
+    # redraw at most once a second, the grid is rebuilt from all pairs found so far 
+    if not found_pairs or (time.perf_counter() - last_render < 1. and num_tested < num_pairs):
+        return
+    last_render = time.perf_counter()
+    partial_table = pd.DataFrame({
+        'Independent': [pair[0] for pair in found_pairs],
+        'Dependent': [pair[1] for pair in found_pairs],
+        'Ratio': [coint_res[0] for coint_res in found_pairs.values()],
+        'Half Life': [coint_res[1] for coint_res in found_pairs.values()]
+    })
+    if partial_grid is None:
+        partial_grid = DataGrid(
+            partial_table,
+            base_row_size=40,base_column_size=100,base_column_header_size=30, base_row_header_size=80, 
+            header_visibility='column', renderers=_RENDERERS_cointpairs, 
+            layout={'height': '400px', 'width': '500px'}
+        )
+        results_grid.children = [VBox(children=[HTML("<h5><font color='ivory'>Co-integrated Pairs Found So Far</h5>"), partial_grid], layout=box_layout)]
+    else:
+        partial_grid.data = partial_table
 
-# Method to update screening dynamically based on universe, time frame and conditions   
-def refresh(*args, **kwargs):
+# Method to run data fetch, screening and backtesting, called on the background executor 
+def run_pipeline():
     
-    global data, coint_pairs, trade_info, bt_metrics
+    global data, coint_pairs, trade_info, bt_metrics, partial_grid
     
-    try: 
-        status.value = _loading
-        run_button.description = 'Loading'
-        run_button.disabled = True
-        
-        # initialise all models for screening 
-        data_model.initialise_model(universe_picker.get_universe(), st_date_comp.value, end_date_comp.value)
-        data = data_model.run()
-        coint_model.initialise_model(data, sig_lvl_comp.value)
-        coint_pairs = coint_model.screen_univ()
-        bt_model.initialise_model(coint_pairs, data, float(init_cap.value), float(std_comp.value))
-        trade_info = bt_model.run()
-        bt_metrics = bt_model.compute_bt_metrics()
-
-        # display quality cointegrated pairs in table 
-        display_results(coint_pairs, trade_info, bt_metrics)
+    found_pairs.clear()
+    partial_grid = None
+    
+    # initialise all models for screening 
+    set_status('Fetching prices')
+    data_model.initialise_model(universe_picker.get_universe(), st_date_comp.value, end_date_comp.value)
+    data = data_model.run()
+    check_cancel('fetching prices')
+    set_status('Fetched {:,} tickers'.format(len(data.get('univ_tickers'))))
+    
+    coint_model.initialise_model(data, sig_lvl_comp.value)
+    coint_model.set_progress(screen_progress, cancel_event)
+    coint_pairs = coint_model.screen_univ()
+    check_cancel('screening')
+    
+    set_status('Backtesting {:,} pairs'.format(len(coint_pairs)))
+    cost_model = CostModel(leg_bps=float(leg_bps_comp.value), borrow_rate=float(borrow_comp.value) / 100)
+    bt_model.initialise_model(coint_pairs, data, float(init_cap.value), float(std_comp.value), cost_model=cost_model)
+    trade_info = bt_model.run()
+    bt_metrics = bt_model.compute_bt_metrics()
+    signal_engine.initialise_model(bt_model)
+    pair_results.initialise_model(coint_model, bt_model, signal_engine)
+    check_cancel('backtesting')
     
+    # display quality cointegrated pairs in table 
+    display_results(pair_results)
+    set_status('Backtested {:,} pairs'.format(len(coint_pairs)), loading=False)
+
+# Method to reset the buttons and report the outcome once the pipeline is done 
+def pipeline_done(future):
+    try:
+        future.result()
+    except ScreeningCancelled as e:
+        # pairs found before the cancellation stay in the results table 
+        set_status('{}, {:,} cointegrated pairs found'.format(e, len(found_pairs)), loading=False)
     except Exception as e:
         # if error, there's no co-integrated pairs 
         results_grid.children = [HTML('No cointegrated pair')]
         results_chart.children = []
+        status.value = ''
         errors.append(e)
         errors.append(traceback.format_exc())
     
-    status.value = ''
     run_button.description = 'Run'
     run_button.disabled = False
+    cancel_button.disabled = True
 
-# Method to display all quality cointegrated pairs in table 
-def display_results(coint_pairs, trade_info, bt_metrics):
+# Method to update screening dynamically based on universe, time frame and conditions, without blocking the kernel 
+def refresh(*args, **kwargs):
     
-    global key_pairs 
-    key_pairs = list(map(str, bt_metrics.get('pnl_pcts').keys()))
-    indep_ticker, dep_ticker = [], []
-    pnl_pcts, win_pcts = [], []
-    num_trades = []
-    max_wins, max_losses = [], []
-    hedge_ratio = []
-    res_table = {}
-        
-    for pair in key_pairs:
-        pair = make_tuple(pair)
-        indep_ticker.append(pair[0])
-        dep_ticker.append(pair[1])
-        pnl_pcts.append(bt_metrics.get('pnl_pcts').get(pair))
-        win_pcts.append(bt_metrics.get('win_pcts').get(pair))
-        num_trades.append(bt_metrics.get('tot_trades').get(pair))
-        max_wins.append(bt_metrics.get('max_wins').get(pair))
-        max_losses.append(bt_metrics.get('max_losses').get(pair))
-        hedge_ratio.append(coint_pairs.get(pair)[0]) 
-            
-        res_table = {'Independent': indep_ticker, 'Dependent': dep_ticker, 'Ratio': hedge_ratio,
-                    'PnL Pcts': pnl_pcts, 'Win Pcts': win_pcts,
-                    'Num Trades': num_trades, 'Max Win': max_wins,
-                    'Max Loss': max_losses}
+    global pipeline
+    
+    if pipeline is not None and not pipeline.done():
+        return
+    cancel_event.clear()
+    run_button.description = 'Loading'
+    run_button.disabled = True
+    cancel_button.disabled = False
+    results_grid.children = []
+    results_chart.children = []
+    set_status('Starting')
+    
+    pipeline = executor.submit(run_pipeline)
+    pipeline.add_done_callback(pipeline_done)
+
+# Method to cancel the running pipeline, screening workers stop after their current chunk of pairs 
+def cancel(*args, **kwargs):
+    cancel_event.set()
+    cancel_button.disabled = True
+    set_status('Cancelling')
+
+# Method to push a new price bar (one price per ticker) to the live signal engine and update the charts 
+def stream_bar(bar_date, prices):
+    live_signals = signal_engine.update(bar_date, prices)
+    pair_results.set_curves(signal_engine)
+    if pair_select is not None:
+        refresh_charts(pair_select.value)
+    return live_signals
+
+# Method to display all quality cointegrated pairs in table, rows are in pair id order 
+def display_results(pair_results):
     
+    res_table = pair_results.table()[_RESULT_COLUMNS]
     results = DataGrid(
-            pd.DataFrame.from_dict(res_table),
+            res_table.reset_index(drop=True),
             base_row_size=40,base_column_size=100,base_column_header_size=30, base_row_header_size=80, 
             header_visibility='column', renderers=_RENDERERS_cointpairs, 
-            layout={'height': '{}px'.format(len(pd.DataFrame.from_dict(res_table))*50+50), 
-                   'width': '700px'}    
+            layout={'height': '{}px'.format(len(res_table)*50+50), 
+                   'width': '1000px'}    
     )
     
     results_centered = VBox(children=[HTML("<h5><font color='ivory'>Quality Co-integrated Pairs</h5>"), results], layout=box_layout)
 
     global pair_select
     
-    pair_select = Dropdown(options=sorted(key_pairs))
+    # dropdown values are pair ids, labels are the tickers of the pair 
+    pair_select = Dropdown(options=pair_results.options())
     results_grid.children = [results_centered, HTML("<h3>Visualisations of Key Backtesting Metrics</h3>"), pair_select] 
     refresh_charts(pair_select.value)
     pair_select.observe(charts_update, 'value')
@@ -383,6 +444,8 @@ method = '''
         <li> The app computes a rolling z-score of the time series of residuals. Trade entry and exit points are calculated where the residual 
         moves above or below the standard deviation specified by the user and exits the strategy once the residual reaches 
         near the mean of the residual (specified as within +/- 0.5 std here). </li>
+        <li> Each trade pays the cost per leg (in bps of the traded notional of both legs) at entry and exit, and the borrow rate 
+        on the short leg while the position is held. </li>
         <li> Key backtesting metrics (percentage of pnl, winning trades etc) are generated. </li>
     </ul>
     
@@ -393,7 +456,7 @@ controls = VBox([
     HTML('<h1>Pairs Trading Application</h1>'),
     HBox([VBox([univ_box, conds_box]), dates_box]),
     HTML('<h1>                  </h1>'),
-    HBox([run_button, status]),
+    HBox([run_button, cancel_button, status]),
     HTML('<h3>Results</h3>'),
     results_grid,
     HTML('<h1>                  </h1>'),
@@ -408,3 +471,4 @@ details = VBox([
 
 # Attaching callback to Run Button
 run_button.on_click(refresh)
+cancel_button.on_click(cancel)
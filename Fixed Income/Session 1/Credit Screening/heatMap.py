@@ -182,7 +182,7 @@ class HeatMap(object):
             col_label_widgets.append(col_widget)
             # for every value in the column we need to make a button and associate
             # a key with it
-            for idx_num, (idx_name, value) in enumerate(data_series.iteritems()):
+            for idx_num, (idx_name, value) in enumerate(data_series.items()):
                 key = (idx_name, col_name)
                 button = self.__build_button(value)
                 self.widgets[button._model_id] = (key, button)
@@ -1,4 +1,4 @@
-cimport bql
+import bql
 from collections import OrderedDict
 import pandas as pd
 import logging
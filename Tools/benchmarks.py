@@ -0,0 +1,321 @@
+'''
+Benchmark suite for the hot paths of the apps, run off-terminal on the synthetic bql stand-in.
+
+Benchmarks:
+
+    screen_univ            Pair Trade    CointModel.screen_univ over the whole universe
+    backtest_run           Pair Trade    BacktestingModel.run on the screened pairs
+    credit_screening       Credit        DataModel.get_results_screening
+    batch_exec_reqs        Peer Curves   BQL_Util.batch_exec_reqs on a batch of bucket requests
+    heatmap_build          Credit        HeatMap widget construction (needs ipywidgets/ matplotlib)
+
+Every benchmark runs at each universe size, timing excludes the setup (data retrieval, screening
+for the backtest, ...). Wall time is the best of the repeats, peak memory is measured with
+tracemalloc on a separate run. Results are appended to a json lines file keyed by the git commit,
+and each run is compared with the latest results of a previous commit:
+
+    python Tools/benchmarks.py
+    python Tools/benchmarks.py --sizes 50 500 --only screen_univ backtest_run
+    python Tools/benchmarks.py --compare-only
+'''
+
+import os, sys, json, time, datetime, argparse, subprocess, tracemalloc, warnings
+import numpy as np
+import pandas as pd
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TOOLS_DIR)
+APP_DIRS = {
+    'pair_trade': os.path.join(REPO_DIR, 'Equity', 'Session 1', 'Pair Trade'),
+    'credit': os.path.join(REPO_DIR, 'Fixed Income', 'Session 1', 'Credit Screening'),
+    'peer_curves': os.path.join(REPO_DIR, 'Fixed Income', 'Session 1', 'Peer Curves'),
+}
+RESULTS_PATH = os.path.join(TOOLS_DIR, 'benchmark_results.jsonl')
+DEFAULT_SIZES = (50, 500, 3000)
+
+sys.path.insert(0, TOOLS_DIR)
+import bql_standin
+
+
+def import_app(app, name):
+    '''
+    Function to import a module from one of the app folders
+
+    Parameters:
+    -----------
+    app: key of APP_DIRS
+    name: module name
+
+    Returns
+    -------
+    module
+    '''
+
+    if APP_DIRS[app] not in sys.path:
+        sys.path.insert(0, APP_DIRS[app])
+    return __import__(name)
+
+
+def get_commit():
+    '''
+    Function to get the current git commit, flagged when the working tree has local changes
+    '''
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR).decode().strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, bool(dirty)
+
+
+def measure(func, repeats):
+    '''
+    Function to time a callable and measure its peak memory
+
+    Parameters:
+    -----------
+    func: callable without arguments
+    repeats: number of timed runs
+
+    Returns
+    -------
+    dictionary of best/ mean wall time in seconds and peak traced memory in MB
+    '''
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    # tracemalloc slows down allocations, so memory is measured on its own run
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(timings), 'mean_seconds': float(np.mean(timings)), 'peak_mb': peak / 2 ** 20}
+
+
+def setup_pair_trade(size, days):
+    '''
+    Function to retrieve the Pair Trade data of a synthetic universe of the given size
+    '''
+
+    DataModel = import_app('pair_trade', 'DataModel')
+    end_date = datetime.date(2023, 12, 29)
+    start_date = (pd.Timestamp(end_date) - pd.tseries.offsets.BDay(days - 1)).date()
+    data_model = DataModel.DataModel()
+    data_model.initialise_model({'type': 'Index', 'value': ['SPX Index']}, start_date, end_date)
+    return data_model.run()
+
+
+def bench_screen_univ(size, days):
+    CointModel = import_app('pair_trade', 'CointModel')
+    data = setup_pair_trade(size, days)
+    coint_model = CointModel.CointModel()
+
+    def run():
+        coint_model.initialise_model(data, '5%')
+        coint_model.screen_univ()
+    return run, {'num_pairs': size * (size - 1) // 2}
+
+
+def bench_backtest_run(size, days):
+    CointModel = import_app('pair_trade', 'CointModel')
+    BacktestingModel = import_app('pair_trade', 'BacktestingModel')
+    data = setup_pair_trade(size, days)
+    coint_model = CointModel.CointModel()
+    coint_model.initialise_model(data, '5%')
+    coint_pairs = coint_model.screen_univ()
+    bt_model = BacktestingModel.BacktestingModel()
+
+    def run():
+        bt_model.initialise_model(coint_pairs, data, 10000., 1.5)
+        bt_model.run()
+    return run, {'num_pairs': len(coint_pairs)}
+
+
+def bench_credit_screening(size, days):
+    model = import_app('credit', 'model')
+    # the credit model reads config.csv from the working directory
+    cwd = os.getcwd()
+    os.chdir(APP_DIRS['credit'])
+    try:
+        data_model = model.DataModel(ticker='LUACTRUU Index', lookback_period=1, periodicity='A',
+                                     sprd_level='', sprd_side='', config=pd.DataFrame(), ptf_only=False)
+    finally:
+        os.chdir(cwd)
+    data_model._init_bql()
+    return data_model.get_results_screening, {}
+
+
+def bench_batch_exec_reqs(size, days, num_requests=20):
+    BQL_Util = import_app('peer_curves', 'BQL_Util')
+    bq = bql_standin.Service()
+    bql_util = BQL_Util.BQL_Util(bq=bq, app=None)
+    univ = bq.univ.list(['SYN{:04d} Corp'.format(i) for i in range(size)])
+    dates = bq.func.range('-1Y', '0D')
+    l_tuples = []
+    for i in range(num_requests):
+        flds = {
+            'OAS': bq.data.spread(spread_type='oas', dates=dates)['value'],
+            'YTW': bq.data.yield_(yield_type='ytw', dates=dates)['value'],
+        }
+        info = {'Label': 'Bucket {}'.format(i), 'Metric Names': 'OAS,YTW'}
+        l_tuples.append((info, bql_standin.Request(univ, flds)))
+
+    def run():
+        bql_util.batch_exec_reqs(l_tuples)
+    return run, {'num_requests': num_requests}
+
+
+def bench_heatmap_build(size, days):
+    heatMap = import_app('credit', 'heatMap')
+    # one row per 10 names of the universe against the duration buckets of the credit app
+    rng = np.random.default_rng(size)
+    columns = ['{}-{}Y'.format(i, i + 1) for i in range(13)]
+    index = ['Rating {}'.format(i) for i in range(max(size // 10, 1))]
+    values = rng.normal(150, 50, (len(index), len(columns)))
+    values[rng.random(values.shape) < 0.1] = np.nan
+    df = pd.DataFrame(values, index=index, columns=columns)
+    layout_dict = {'height': '30px', 'width': '60px', 'min_width': '60px'}
+
+    def run():
+        heatMap.HeatMap(df, colormap_name='YlOrRd', title='OAS', layout_dict=layout_dict,
+                        button_css='go-btn', include_index=True)
+    return run, {'cells': df.size}
+
+
+BENCHMARKS = {
+    'screen_univ': bench_screen_univ,
+    'backtest_run': bench_backtest_run,
+    'credit_screening': bench_credit_screening,
+    'batch_exec_reqs': bench_batch_exec_reqs,
+    'heatmap_build': bench_heatmap_build,
+}
+
+
+def run_benchmarks(names, sizes, days, repeats):
+    '''
+    Function to run the benchmarks at each universe size
+
+    Parameters:
+    -----------
+    names: list of benchmark names
+    sizes: list of universe sizes
+    days: number of business days of the price history
+    repeats: number of timed runs per benchmark
+
+    Returns
+    -------
+    list of result dictionaries
+    '''
+
+    commit, dirty = get_commit()
+    timestamp = datetime.datetime.now().isoformat(timespec='seconds')
+    results = []
+    for size in sizes:
+        bql_standin.install(mode='synthetic', generator=bql_standin.SyntheticData(num_tickers=size))
+        for name in names:
+            record = {'commit': commit, 'dirty': dirty, 'timestamp': timestamp,
+                      'benchmark': name, 'size': size, 'days': days}
+            try:
+                func, info = BENCHMARKS[name](size, days)
+                record.update(info)
+                record.update(measure(func, repeats))
+                record['status'] = 'ok'
+            except ImportError as e:
+                record['status'] = 'skipped: {}'.format(e)
+            except Exception as e:
+                record['status'] = 'error: {}: {}'.format(type(e).__name__, e)
+            results.append(record)
+            print(format_record(record), flush=True)
+    return results
+
+
+def format_record(record):
+    if record['status'] != 'ok':
+        return '{:<18} {:>6}  {}'.format(record['benchmark'], record['size'], record['status'])
+    return '{:<18} {:>6}  {:>10.4f}s  {:>10.1f}MB'.format(record['benchmark'], record['size'],
+                                                         record['seconds'], record['peak_mb'])
+
+
+def save_results(results, path=RESULTS_PATH):
+    with open(path, 'a') as f:
+        for record in results:
+            f.write(json.dumps(record) + '\n')
+
+
+def load_results(path=RESULTS_PATH):
+    '''
+    Function to load the stored benchmark results
+
+    Returns
+    -------
+    dataframe with one row per benchmark run
+    '''
+
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def compare(df, commit=None):
+    '''
+    Function to compare the latest results of a commit with the latest results of the previous commit
+
+    Parameters:
+    -----------
+    df: dataframe of stored results
+    commit: commit to compare, by default the most recent one
+
+    Returns
+    -------
+    dataframe of seconds/ peak memory per benchmark and size with the ratio to the baseline
+    '''
+
+    df = df[df['status'] == 'ok']
+    if df.empty:
+        return pd.DataFrame()
+    commits = list(dict.fromkeys(df.sort_values('timestamp')['commit']))
+    commit = commit or commits[-1]
+    previous = commits[:commits.index(commit)]
+    latest = df.sort_values('timestamp').groupby(['commit', 'benchmark', 'size']).last()
+    current = latest.loc[commit][['seconds', 'peak_mb']]
+    if not previous:
+        return current
+    baseline = latest.loc[previous[-1]][['seconds', 'peak_mb']]
+    out = current.join(baseline, rsuffix='_' + previous[-1], how='left')
+    out['speedup'] = out['seconds_' + previous[-1]] / out['seconds']
+    out['memory_ratio'] = out['peak_mb'] / out['peak_mb_' + previous[-1]]
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the apps on synthetic data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='universe sizes')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--days', type=int, default=750, help='business days of price history')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per benchmark')
+    parser.add_argument('--results', default=RESULTS_PATH, help='json lines file of stored results')
+    parser.add_argument('--no-save', action='store_true', help='do not store the results')
+    parser.add_argument('--compare-only', action='store_true', help='only compare the stored results')
+    args = parser.parse_args(argv)
+
+    warnings.simplefilter('ignore')
+    if not args.compare_only:
+        results = run_benchmarks(args.only, args.sizes, args.days, args.repeats)
+        if not args.no_save:
+            save_results(results, args.results)
+    comparison = compare(load_results(args.results)) if (args.compare_only or not args.no_save) else pd.DataFrame()
+    if not comparison.empty:
+        with pd.option_context('display.width', 200, 'display.max_columns', 20):
+            print(comparison.round(4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,538 @@
+'''
+Local stand-in for the bql package, used to run the apps and their hot paths off-terminal.
+
+The stand-in mirrors the parts of the bql API used in this repository (bql.Service with the
+data/ func/ univ namespaces, execute, execute_many, bql.Request and bql.combined_df) and
+works in three modes:
+
+    record     requests are forwarded to the real bql service and every response is saved to disk
+    replay     responses are served from the recordings, keyed by the canonical request string
+    synthetic  responses are generated from a deterministic synthetic data set (SyntheticData)
+
+A replay stand-in can also be given a SyntheticData generator to fill requests that were never
+recorded. Call install() before importing the app modules so that their `import bql` picks up
+the stand-in:
+
+    import bql_standin
+    bql_standin.install(mode='synthetic', generator=bql_standin.SyntheticData(num_tickers=500))
+    from DataModel import DataModel
+'''
+
+import os, sys, hashlib, pickle, datetime, operator, zlib
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+
+_real_bql = None
+_defaults = {'mode': 'replay', 'path': 'bql_recordings', 'generator': None}
+
+
+def install(mode='replay', path='bql_recordings', generator=None):
+    '''
+    Function to register the stand-in as the bql module
+
+    Parameters:
+    -----------
+    mode: 'record', 'replay' or 'synthetic'
+    path: folder of the recordings
+    generator: SyntheticData used in synthetic mode and for requests missing from the recordings
+
+    Returns
+    -------
+    the stand-in module
+    '''
+
+    global _real_bql
+    if mode == 'record' and _real_bql is None:
+        sys.modules.pop('bql', None)
+        import bql as real_bql
+        _real_bql = real_bql
+    if mode == 'synthetic' and generator is None:
+        generator = SyntheticData()
+    _defaults.update({'mode': mode, 'path': path, 'generator': generator})
+    module = sys.modules[__name__]
+    sys.modules['bql'] = module
+    return module
+
+
+def _to_string(value):
+    '''
+    Function to get the canonical string of a request argument
+    '''
+
+    if isinstance(value, Item):
+        return value.to_string()
+    if isinstance(value, str):
+        return "'{}'".format(value)
+    if isinstance(value, (datetime.date, datetime.datetime, pd.Timestamp)):
+        return "'{}'".format(value.isoformat())
+    if isinstance(value, (list, tuple)):
+        return '[{}]'.format(','.join(_to_string(v) for v in value))
+    return repr(value)
+
+
+def _realize(value, service):
+    '''
+    Function to rebuild a request argument against the real bql service
+    '''
+
+    if isinstance(value, Item):
+        return value.realize(service)
+    if isinstance(value, list):
+        return [_realize(v, service) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_realize(v, service) for v in value)
+    return value
+
+
+_BINOPS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.truediv, '**': operator.pow,
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+    '&': operator.and_, '|': operator.or_,
+}
+
+
+class Item(object):
+    '''
+    Item class for a node of a bql expression (data item, function, universe, operator or method call)
+    '''
+
+    def __init__(self, kind, name, args=(), kwargs=None, parent=None):
+        self.kind = kind
+        self.name = name
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.parent = parent
+        self.namespace = None
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: Item('method', name, args, kwargs, parent=self)
+
+    def __getitem__(self, key):
+        return Item('getitem', key, parent=self)
+
+    def __neg__(self):
+        return Item('neg', '-', parent=self)
+
+    def _binop(symbol, reflected=False):
+        def func(self, other):
+            args = (other, self) if reflected else (self, other)
+            return Item('binop', symbol, args)
+        return func
+
+    __add__, __radd__ = _binop('+'), _binop('+', True)
+    __sub__, __rsub__ = _binop('-'), _binop('-', True)
+    __mul__, __rmul__ = _binop('*'), _binop('*', True)
+    __truediv__, __rtruediv__ = _binop('/'), _binop('/', True)
+    __pow__ = _binop('**')
+    __gt__, __ge__, __lt__, __le__ = _binop('>'), _binop('>='), _binop('<'), _binop('<=')
+    __eq__, __ne__ = _binop('=='), _binop('!=')
+    __and__, __or__ = _binop('&'), _binop('|')
+    __hash__ = object.__hash__
+    del _binop
+
+    def _call_string(self):
+        # python-safe names such as yield_ or in_ map to the bql function name
+        params = [_to_string(a) for a in self.args] + ['{}={}'.format(k, _to_string(v)) for k, v in self.kwargs.items()]
+        return '{}({})'.format(self.name.rstrip('_'), ','.join(params))
+
+    def to_string(self):
+        '''
+        Function to get the canonical string of the expression
+        '''
+
+        if self.kind == 'call':
+            return self._call_string()
+        if self.kind == 'method':
+            return '{}.{}'.format(self.parent.to_string(), self._call_string())
+        if self.kind == 'binop':
+            return '({}{}{})'.format(_to_string(self.args[0]), self.name, _to_string(self.args[1]))
+        if self.kind == 'neg':
+            return '-({})'.format(self.parent.to_string())
+        return '{}[{}]'.format(self.parent.to_string(), _to_string(self.name))
+
+    def realize(self, service):
+        '''
+        Function to rebuild the expression with the real bql service
+
+        Parameters:
+        -----------
+        service: real bql.Service instance
+        '''
+
+        if self.kind == 'call':
+            func = getattr(getattr(service, self.namespace), self.name)
+            return func(*_realize(self.args, service), **{k: _realize(v, service) for k, v in self.kwargs.items()})
+        if self.kind == 'method':
+            func = getattr(self.parent.realize(service), self.name)
+            return func(*_realize(self.args, service), **{k: _realize(v, service) for k, v in self.kwargs.items()})
+        if self.kind == 'binop':
+            return _BINOPS[self.name](_realize(self.args[0], service), _realize(self.args[1], service))
+        if self.kind == 'neg':
+            return -self.parent.realize(service)
+        return self.parent.realize(service)[self.name]
+
+    def walk(self):
+        '''
+        Function to iterate over the expression and all its sub-expressions
+        '''
+
+        yield self
+        children = list(self.args) + list(self.kwargs.values()) + ([self.parent] if self.parent is not None else [])
+        for child in children:
+            for value in (child if isinstance(child, (list, tuple)) else [child]):
+                if isinstance(value, Item):
+                    for item in value.walk():
+                        yield item
+
+    def __repr__(self):
+        return self.to_string()
+
+
+class _Namespace(object):
+    '''
+    Namespace of bql functions (data, func or univ)
+    '''
+
+    def __init__(self, namespace):
+        self._namespace = namespace
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        namespace = self._namespace
+
+        def func(*args, **kwargs):
+            item = Item('call', name, args, kwargs)
+            item.namespace = namespace
+            return item
+        return func
+
+
+class Request(object):
+    '''
+    Request class mirroring bql.Request
+    '''
+
+    def __init__(self, universe, items, with_params=None, preferences=None):
+        self.universe = universe
+        self.items = items if isinstance(items, dict) else {'ITEM': items}
+        self.single_item = not isinstance(items, dict)
+        self.with_params = with_params or {}
+        self.preferences = preferences or {}
+
+    def to_string(self):
+        '''
+        Function to get the canonical string of the request
+        '''
+
+        query = 'get({}) for({})'.format(
+            ','.join('{}={}'.format(k, _to_string(v)) for k, v in self.items.items()), _to_string(self.universe))
+        if self.with_params:
+            query += ' with({})'.format(','.join('{}={}'.format(k, _to_string(v)) for k, v in self.with_params.items()))
+        if self.preferences:
+            query += ' preferences({})'.format(','.join('{}={}'.format(k, _to_string(v)) for k, v in self.preferences.items()))
+        return query
+
+    def realize(self, service):
+        items = {k: _realize(v, service) for k, v in self.items.items()}
+        kwargs = {}
+        if self.with_params:
+            kwargs['with_params'] = self.with_params
+        if self.preferences:
+            kwargs['preferences'] = self.preferences
+        return _real_bql.Request(_realize(self.universe, service), items, **kwargs)
+
+
+class SingleItemResponse(object):
+    '''
+    Response of one requested item
+    '''
+
+    def __init__(self, name, df):
+        self.name = name
+        self._df = df
+
+    def df(self):
+        return self._df.copy()
+
+
+class Response(object):
+    '''
+    Response class mirroring the bql response of a request, an iterable of item responses
+    '''
+
+    def __init__(self, results):
+        self._results = [SingleItemResponse(name, df) for name, df in results]
+
+    def __iter__(self):
+        return iter(self._results)
+
+    def __len__(self):
+        return len(self._results)
+
+    def __getitem__(self, i):
+        return self._results[i]
+
+    def get(self, name):
+        for res in self._results:
+            if res.name == name:
+                return res
+        raise KeyError(name)
+
+    def single(self):
+        return self._results[0]
+
+
+def combined_df(response):
+    '''
+    Function to join the results of all the items of a response on their IDs (and dates)
+    '''
+
+    dfs = []
+    for res in response:
+        df = res.df()
+        keys = [col for col in ('DATE', 'PERIOD_END_DATE') if col in df.columns]
+        dfs.append(df.set_index(keys, append=True)[[res.name]] if keys else df[[res.name]])
+    return pd.concat(dfs, axis=1)
+
+
+class Service(object):
+    '''
+    Service class mirroring bql.Service, backed by recordings and/ or synthetic data
+    '''
+
+    def __init__(self, mode=None, path=None, generator=None):
+        self.mode = mode or _defaults['mode']
+        self.path = path or _defaults['path']
+        self.generator = generator or _defaults['generator']
+        self.data, self.func, self.univ = _Namespace('data'), _Namespace('func'), _Namespace('univ')
+        self._service = _real_bql.Service() if self.mode == 'record' else None
+        self.hits, self.misses = 0, 0
+
+    @staticmethod
+    def request_string(request):
+        '''
+        Function to get the canonical string of a request object or BQL query string
+        '''
+
+        return ' '.join(request.split()) if isinstance(request, str) else request.to_string()
+
+    def get_path(self, request):
+        key = hashlib.sha1(self.request_string(request).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key + '.pkl')
+
+    def record(self, request):
+        '''
+        Function to execute a request on the real bql service and save its response
+        '''
+
+        real_request = request if isinstance(request, str) else request.realize(self._service)
+        results = [(res.name, res.df()) for res in self._service.execute(real_request)]
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.get_path(request), 'wb') as f:
+            pickle.dump({'request': self.request_string(request), 'results': results}, f)
+        return results
+
+    def replay(self, request):
+        '''
+        Function to read the recorded response of a request, falling back on the synthetic generator
+        '''
+
+        path = self.get_path(request)
+        if os.path.exists(path):
+            self.hits += 1
+            with open(path, 'rb') as f:
+                return pickle.load(f)['results']
+        self.misses += 1
+        if self.generator is None:
+            raise KeyError('No recording for request: {}'.format(self.request_string(request)))
+        return self.generator.generate(request)
+
+    def execute(self, request, callback=None):
+        '''
+        Function to execute a request, like bql.Service.execute a callback turns the call into a future
+        '''
+
+        if self.mode == 'record':
+            results = self.record(request)
+        elif self.mode == 'synthetic':
+            results = self.generator.generate(request)
+        else:
+            results = self.replay(request)
+        response = Response(results)
+
+        if callback is None:
+            return response
+        future = Future()
+        try:
+            future.set_result(callback(response))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def execute_many(self, requests):
+        return [self.execute(request) for request in requests]
+
+
+_STRING_FIELDS = ('name', 'country', 'sector', 'industry', 'classification', 'rating', 'crncy', 'ticker',
+                  'cpn_typ', 'payment_rank', 'exch_code', 'bb_composite', 'srch_asset_class')
+_PRICE_FIELDS = ('px_last', 'px_open', 'px_high', 'px_low', 'best_target_price', 'smavg')
+_POSITIVE_FIELDS = ('mkt_cap', 'market_cap', 'turnover', 'amt_outstanding', 'volume', 'volatility', 'duration', 'maturity')
+
+
+class SyntheticData(object):
+    '''
+    SyntheticData class generating deterministic responses for any request
+
+    Index/ screen universes resolve to num_tickers synthetic tickers. Price fields follow a factor
+    model in which tickers of the same cluster share a random walk, so that part of the universe
+    is cointegrated. Requests with a date range return time series, other requests one value per ID.
+    '''
+
+    def __init__(self, num_tickers=500, cluster_size=5, seed=0):
+        self.num_tickers = num_tickers
+        self.cluster_size = cluster_size
+        self.seed = seed
+
+    def _rng(self, *keys):
+        return np.random.default_rng([self.seed] + [zlib.crc32(str(k).encode('utf-8')) for k in keys])
+
+    def resolve_universe(self, univ):
+        '''
+        Function to get the list of tickers of a universe
+        '''
+
+        if isinstance(univ, str):
+            return [univ]
+        if isinstance(univ, (list, tuple)):
+            return list(univ)
+        if isinstance(univ, Item):
+            if univ.kind == 'call' and univ.name == 'list':
+                return self.resolve_universe(univ.args[0] if univ.args else univ.kwargs.get('names', []))
+            if univ.name == 'filter':
+                return self.resolve_universe(univ.args[0] if univ.kind == 'call' else univ.parent)
+        return ['SYN{:04d} Equity'.format(i) for i in range(self.num_tickers)]
+
+    @staticmethod
+    def _resolve_date(value, today):
+        if isinstance(value, (datetime.date, datetime.datetime, pd.Timestamp)):
+            return pd.Timestamp(value)
+        value = str(value).strip()
+        if value[:1] in '+-0' and value[-1:].upper() in 'DWMY' and value[:-1].lstrip('+-').isdigit():
+            num, unit = int(value[:-1]), value[-1].upper()
+            offset = {'D': pd.DateOffset(days=num), 'W': pd.DateOffset(weeks=num),
+                      'M': pd.DateOffset(months=num), 'Y': pd.DateOffset(years=num)}[unit]
+            return today + offset
+        return pd.Timestamp(value)
+
+    def get_dates(self, item):
+        '''
+        Function to get the dates of a time series item, None for a point in time item
+        '''
+
+        today = pd.Timestamp(datetime.date.today())
+        for node in item.walk():
+            for key in ('dates', 'calc_interval', 'start'):
+                value = node.kwargs.get(key)
+                if isinstance(value, Item) and value.name == 'range':
+                    bounds = list(value.args) + [value.kwargs.get(k) for k in ('start', 'end') if k in value.kwargs]
+                    if len(bounds) >= 2:
+                        start, end = (self._resolve_date(b, today) for b in bounds[:2])
+                        return pd.bdate_range(start, end)
+        return None
+
+    def prices(self, tickers, dates):
+        '''
+        Function to generate price paths, tickers of a cluster share a random walk factor
+        '''
+
+        num_days = len(dates)
+        prices = np.empty((num_days, len(tickers)))
+        for k, ticker in enumerate(tickers):
+            cluster = k // self.cluster_size
+            factor = np.cumsum(self._rng('factor', cluster).normal(0, 0.01, num_days))
+            rng = self._rng('price', ticker)
+            noise = np.zeros(num_days)
+            shocks = rng.normal(0, 0.005, num_days)
+            # half of each cluster mean-reverts around the factor, the other half drifts away
+            phi = 0.9 if k % 2 == 0 else 1.0
+            for t in range(1, num_days):
+                noise[t] = phi * noise[t - 1] + shocks[t]
+            prices[:, k] = np.exp(np.log(rng.uniform(10, 200)) + rng.uniform(0.5, 1.5) * factor + noise)
+        return prices
+
+    def values(self, field, tickers, shape):
+        '''
+        Function to generate the values of a non-price field
+        '''
+
+        rng = self._rng('field', field, len(tickers))
+        if any(key in field for key in _STRING_FIELDS):
+            pool = ['{} {}'.format(field.split('(')[0].strip('#').title(), i) for i in range(8)]
+            return rng.choice(pool, size=shape)
+        if any(key in field for key in _POSITIVE_FIELDS):
+            return rng.lognormal(mean=7, sigma=1.5, size=shape)
+        return rng.normal(0, 1, size=shape)
+
+    def generate_item(self, name, item, tickers):
+        '''
+        Function to generate the dataframe of one requested item
+        '''
+
+        dates = self.get_dates(item) if isinstance(item, Item) else None
+        field = item.to_string().lower() if isinstance(item, Item) else str(item).lower()
+        root = [node.name.lower() for node in item.walk() if node.kind == 'call' and node.namespace == 'data'] if isinstance(item, Item) else []
+        root = root[0] if root else field
+        ids = pd.Index(tickers, name='ID')
+
+        if dates is None or len(dates) == 0:
+            return pd.DataFrame({name: self.values(field, tickers, len(tickers))}, index=ids)
+
+        if root in _PRICE_FIELDS:
+            values = self.prices(tickers, dates)
+            methods = []
+            node = item
+            while node is not None and node.kind == 'method':
+                methods.append(node.name)
+                node = node.parent
+            if 'diff' in methods:
+                values = np.vstack([np.full((1, len(tickers)), np.nan), np.diff(values, axis=0)])
+            if 'ln' in methods:
+                values = np.log(values)
+        else:
+            values = self.values(field, tickers, (len(dates), len(tickers)))
+        return pd.DataFrame({
+            'DATE': np.repeat(dates.values[None, :], len(tickers), axis=0).ravel(),
+            name: values.T.ravel()
+        }, index=ids.repeat(len(dates)))
+
+    def generate(self, request):
+        '''
+        Function to generate the results of a request object or BQL query string
+
+        Returns
+        -------
+        list of (item name, dataframe)
+        '''
+
+        if isinstance(request, str):
+            # BQL strings: one value per ID for each '... as #name' item of the get() clause
+            parts, depth, current = [], 0, ''
+            for char in request.split('get(', 1)[-1]:
+                depth += {'(': 1, '[': 1, ')': -1, ']': -1}.get(char, 0)
+                if depth < 0:
+                    break
+                if char == ',' and depth == 0:
+                    parts.append(current)
+                    current = ''
+                else:
+                    current += char
+            names = [' '.join(part.split()).split(' as ')[-1] for part in parts + [current] if part.strip()]
+            tickers = self.resolve_universe(None)
+            return [(name, self.generate_item(name, name, tickers)) for name in names]
+
+        tickers = self.resolve_universe(request.universe)
+        return [(name, self.generate_item(name, item, tickers)) for name, item in request.items.items()]